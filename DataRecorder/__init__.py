@@ -2,3 +2,4 @@ from .byte_recorder import ByteRecorder
 from .db_recorder import DBRecorder
 from .filler import Filler
 from .recorder import Recorder
+from .sharded_db_recorder import ShardedDBRecorder
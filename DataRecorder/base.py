@@ -1,12 +1,19 @@
 # -*- coding:utf-8 -*-
 from abc import abstractmethod
+from atexit import register
+from collections import deque
 from pathlib import Path
-from threading import Lock
+from sys import is_finalizing
+from threading import Lock, Condition, Thread, current_thread, main_thread
 from time import sleep
+from weakref import WeakSet, ref
 
 from .setter import OriginalSetter, BaseSetter
 from .tools import get_usable_path
 
+_async_recorders = WeakSet()  # 开启过异步写入的记录器，解释器退出前写完其数据
+_IDLE_WAIT = .2  # 后台线程空闲时每隔多少秒检查一次主线程是否已结束
+
 
 class OriginalRecorder(object):
     """记录器的基类"""
@@ -20,19 +27,27 @@ class OriginalRecorder(object):
         self._data = None
         self._path = None
         self._type = None
-        self._lock = Lock()
-        self._pause_add = False  # 文件写入时暂停接收输入
-        self._pause_write = False  # 标记文件正在被一个线程写入
+        self._lock = Lock()  # 保护缓存数据，只在添加数据和交换缓存时持有
+        self._writing = False  # 标记文件正在被一个线程写入
         self.show_msg = True
         self._setter = None
         self._data_count = 0  # 已缓存数据的条数
+        self._async = False  # 是否由后台线程写入文件
+        self._batches = deque()  # 等待后台线程写入的数据
+        self._queue_size = 0  # 最多有多少批数据等待写入，超过时add_data()等待，0为不限
+        self._writer = None  # 后台写入线程
+        self._writer_closing = False  # 通知后台线程写完已提交的数据后结束
+        self._writer_cond = Condition()
+        self._writer_error = None  # 后台线程写入时发生的异常
 
         if path:
             self.set.path(path)
         self._cache = cache_size if cache_size is not None else 1000
 
     def __del__(self):
-        """对象关闭时把剩下的数据写入文件"""
+        """对象关闭时等待后台线程写完并结束，剩下的数据在当前线程写入文件，不再启动后台线程"""
+        self._async = False
+        self._stop_writer()
         self.record()
 
     @property
@@ -67,77 +82,218 @@ class OriginalRecorder(object):
         :param new_path: 文件另存为的路径，会保存新文件
         :return: 文件路径
         """
-        # 具体功能由_record()实现，本方法实现自动重试及另存文件功能
-        original_path = return_path = self._path
-        if new_path:
-            new_path = str(get_usable_path(new_path))
-            return_path = self._path = new_path
+        # 具体功能由_write()实现，本方法实现另存文件功能
+        if self._use_writer() and not new_path:
+            self.flush()
+            return self._path
+        self._wait_writer()  # 先等待后台线程写完已提交的数据
 
-            if Path(original_path).exists():
-                from shutil import copy
-                copy(original_path, self._path)
+        original_path = return_path = self._path
+        self._begin_write()  # 更换路径、复制文件和写入期间占用写入权，后台线程不会写入另存的文件
+        try:
+            if new_path:
+                new_path = str(get_usable_path(new_path))
+                return_path = self._path = new_path
 
-        if not self._data:
-            return return_path
+                if Path(original_path).exists():
+                    from shutil import copy
+                    copy(original_path, self._path)
 
-        if not self._path:
-            raise ValueError('保存路径为空。')
+            if not self._data:
+                return return_path
 
-        with self._lock:
-            self._pause_add = True  # 写入文件前暂缓接收数据
-            if self.show_msg:
-                print(f'{self.path} 开始写入文件，切勿关闭进程。')
+            if not self._path:
+                raise ValueError('保存路径为空。')
 
-            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
-            while True:
+            data, count = self._take()  # 只在交换缓存时阻塞添加数据
+            if data:
                 try:
-                    while self._pause_write:  # 等待其它线程写入结束
-                        sleep(.1)
-
-                    self._pause_write = True
-                    self._record()
-                    break
-
-                except PermissionError:
-                    if self.show_msg:
-                        print('\r文件被打开，保存失败，请关闭，程序会自动重试。', end='')
-
-                except Exception as e:
-                    try:
-                        with open('failed_data.txt', 'a+', encoding='utf-8') as f:
-                            f.write(str(self.data) + '\n')
-                        print('保存失败的数据已保存到failed_data.txt。')
-                    except:
-                        raise e
+                    self._write(data)
+                except Exception:
+                    with self._lock:
+                        self._restore(data, count)
                     raise
 
-                finally:
-                    self._pause_write = False
-
-                sleep(.3)
-
+        finally:
             if new_path:
                 self._path = original_path
-
-            if self.show_msg:
-                print(f'{self.path} 写入文件结束。')
-            self.clear()
-            self._data_count = 0
-            self._pause_add = False
+            self._end_write()
 
         return return_path
 
+    def flush(self, wait=True):
+        """把缓存中的数据写入文件，开启异步写入时交给后台线程写入，后台线程写入出错时，下次调用抛出其异常
+        :param wait: 是否等待数据写入完成，为False时不阻塞，只在开启异步写入时有效
+        :return: None
+        """
+        if not self._use_writer():
+            self.record()
+            return
+
+        with self._writer_cond:  # 后台线程写入出错时先抛出异常，不再把出错的数据交给后台线程
+            e, self._writer_error = self._writer_error, None
+        if e is not None:
+            raise e
+
+        if self._data:
+            if not self._path:
+                raise ValueError('保存路径为空。')
+
+            with self._writer_cond:  # 在条件锁内交换，保证各批数据按顺序入队
+                while self._writer is not None and 0 < self._queue_size <= len(self._batches):
+                    self._writer_cond.wait()
+                data, count = self._take()
+                if data:
+                    self._batches.append((data, count))
+                    if self._writer is None:
+                        self._writer_closing = False
+                        self._writer = Thread(target=_write_batches, args=(ref(self),), name='DataRecorderWriter')
+                        self._writer.start()
+                    else:
+                        self._writer_cond.notify_all()
+
+        if wait:
+            self._wait_writer()
+
     def clear(self):
         """清空缓存中的数据"""
-        if self._data:
-            self._data.clear()
+        with self._lock:
+            if self._data:
+                self._data.clear()
+            self._data_count = 0
+
+    def _use_writer(self):
+        """返回是否交给后台线程写入，解释器退出时不能再启动线程，改为直接写入
+        :return: bool
+        """
+        return self._async and not is_finalizing()
+
+    def _check_cache(self):
+        """缓存数据达到cache_size时写入文件，开启异步写入时交给后台线程"""
+        if 0 < self._cache <= self._data_count:
+            if self._use_writer():
+                self.flush(wait=False)
+            else:
+                self.record()
+
+    def _write(self, data):
+        """把一批数据写入文件，文件被打开时自动重试
+        :param data: 要写入的数据
+        :return: None
+        """
+        if self.show_msg:
+            print(f'{self.path} 开始写入文件，切勿关闭进程。')
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            try:
+                self._record(data)
+                break
+
+            except PermissionError:
+                if self.show_msg:
+                    print('\r文件被打开，保存失败，请关闭，程序会自动重试。', end='')
+
+            except Exception as e:
+                try:
+                    with open('failed_data.txt', 'a+', encoding='utf-8') as f:
+                        f.write(str(data) + '\n')
+                    print('保存失败的数据已保存到failed_data.txt。')
+                except:
+                    raise e
+                raise
+
+            sleep(.3)
+
+        if self.show_msg:
+            print(f'{self.path} 写入文件结束。')
+
+    def _stop_writer(self):
+        """等待后台线程写完已提交的数据并结束，在停止异步写入、更换路径和对象关闭时调用"""
+        with self._writer_cond:
+            writer = self._writer
+            if writer is None:
+                return
+            self._writer_closing = True
+            self._writer_cond.notify_all()
+            if writer is current_thread():  # 对象在后台线程中被回收，该线程已没有要写的数据
+                self._writer_stop()
+                self._writer = None
+                return
+        writer.join()
+
+    def _fail_batches(self, e):
+        """后台写入出错时，把未写入的数据放回缓存，异常交给等待的线程
+        :param e: 发生的异常
+        :return: None
+        """
+        with self._writer_cond, self._lock:
+            while self._batches:
+                self._restore(*self._batches.pop())
+            self._writer_error = e
+            self._writer_cond.notify_all()
+
+    def _writer_start(self):
+        """后台写入线程开始时在该线程中执行，供子类准备只在该线程使用的资源"""
+        pass
+
+    def _writer_stop(self):
+        """后台写入线程结束前在该线程中执行，供子类释放_writer_start()准备的资源"""
+        pass
+
+    def _begin_write(self):
+        """等待其它线程写入结束，然后占用写入权"""
+        with self._writer_cond:
+            while self._writing:
+                self._writer_cond.wait()
+            self._writing = True
+
+    def _end_write(self):
+        """释放写入权，唤醒等待的线程"""
+        with self._writer_cond:
+            self._writing = False
+            self._writer_cond.notify_all()
+
+    def _take(self):
+        """取出缓存中的数据并换上空缓存
+        :return: 取出的数据和条数
+        """
+        with self._lock:
+            data, count = self._data, self._data_count
+            if data:
+                self._data = type(data)()
+                self._data_count = 0
+            return data, count
+
+    def _wait_writer(self):
+        """等待后台线程写完已提交的数据，如写入出错，抛出其异常"""
+        with self._writer_cond:
+            while self._batches:
+                self._writer_cond.wait()
+            e, self._writer_error = self._writer_error, None
+        if e is not None:
+            raise e
+
+    def _restore(self, data, count):
+        """把未能写入的数据放回缓存最前面，调用前须持有self._lock
+        :param data: 未写入的数据
+        :param count: 数据条数
+        :return: None
+        """
+        if isinstance(data, dict):
+            for k, v in self._data.items():
+                data.setdefault(k, []).extend(v)
+        else:
+            data.extend(self._data)
+        self._data = data
+        self._data_count += count
 
     @abstractmethod
     def add_data(self, data):
         pass
 
     @abstractmethod
-    def _record(self):
+    def _record(self, data):
         pass
 
     # ---------------即将废弃--------------------
@@ -196,7 +352,7 @@ class BaseRecorder(OriginalRecorder):
         pass
 
     @abstractmethod
-    def _record(self):
+    def _record(self, data):
         pass
 
     # ---------------即将废弃--------------------
@@ -213,3 +369,58 @@ class BaseRecorder(OriginalRecorder):
         :return: None
         """
         self.set.after(after)
+
+
+def _write_batches(recorder_ref):
+    """后台线程逐批写入数据，空闲时等待新数据，直到被通知结束或主线程结束
+    :param recorder_ref: 记录器的弱引用，线程空闲时不持有记录器，使其可以被回收
+    :return: None
+    """
+    recorder = recorder_ref()
+    if recorder is None:
+        return
+    cond = recorder._writer_cond
+    try:
+        recorder._writer_start()
+    except Exception as e:
+        recorder._fail_batches(e)
+
+    while True:
+        with cond:
+            while not recorder._batches:
+                if recorder._writer_closing or not main_thread().is_alive():
+                    recorder._writer_stop()
+                    recorder._writer = None
+                    cond.notify_all()
+                    return
+                recorder = None
+                cond.wait(_IDLE_WAIT)
+                recorder = recorder_ref()
+                if recorder is None:  # 记录器已被回收，其__del__()已结束本线程的工作
+                    return
+            data, count = recorder._batches[0]
+
+        recorder._begin_write()
+        try:
+            recorder._write(data)
+
+        except Exception as e:
+            recorder._fail_batches(e)
+            continue
+
+        finally:
+            recorder._end_write()
+
+        with cond:
+            recorder._batches.popleft()
+            cond.notify_all()  # 唤醒等待队列空位和等待写完的线程
+
+
+@register
+def _close_async_recorders():
+    """解释器退出前（此时内置函数仍可用），等待开启了异步写入的记录器的后台线程，并写入剩下的数据"""
+    for r in list(_async_recorders):
+        try:
+            r.__del__()
+        except Exception as e:
+            print(f'{r.path} 退出时写入失败：{e}')
@@ -1,11 +1,16 @@
 # -*- coding:utf-8 -*-
 from abc import abstractmethod
+from collections import deque
 from pathlib import Path
-from threading import Lock
-from typing import Union, Any, Optional
+from threading import Lock, Condition, Thread
+from typing import Union, Any, Optional, Tuple
+from weakref import WeakSet, ReferenceType
 
 from .setter import OriginalSetter, BaseSetter
 
+_async_recorders: WeakSet = ...
+_IDLE_WAIT: float = ...
+
 
 class OriginalRecorder(object):
     SUPPORTS: tuple = ...
@@ -14,11 +19,17 @@ class OriginalRecorder(object):
     _type: Optional[str] = ...
     _data: Optional[list, dict] = ...
     _lock: Lock = ...
-    _pause_add: bool = ...
-    _pause_write: bool = ...
+    _writing: bool = ...
     show_msg: bool = ...
     _setter: Optional[OriginalSetter] = ...
     _data_count: int = ...
+    _async: bool = ...
+    _batches: deque = ...
+    _queue_size: int = ...
+    _writer: Optional[Thread] = ...
+    _writer_closing: bool = ...
+    _writer_cond: Condition = ...
+    _writer_error: Optional[Exception] = ...
 
     def __init__(self,
                  path: Optional[str, Path] = None,
@@ -43,13 +54,39 @@ class OriginalRecorder(object):
 
     def record(self, new_path: Optional[str, Path] = None) -> str: ...
 
+    def flush(self, wait: bool = True) -> None: ...
+
     def clear(self) -> None: ...
 
+    def _use_writer(self) -> bool: ...
+
+    def _check_cache(self) -> None: ...
+
+    def _write(self, data: Union[list, dict]) -> None: ...
+
+    def _stop_writer(self) -> None: ...
+
+    def _fail_batches(self, e: Exception) -> None: ...
+
+    def _writer_start(self) -> None: ...
+
+    def _writer_stop(self) -> None: ...
+
+    def _begin_write(self) -> None: ...
+
+    def _end_write(self) -> None: ...
+
+    def _take(self) -> Tuple[Union[list, dict, None], int]: ...
+
+    def _wait_writer(self) -> None: ...
+
+    def _restore(self, data: Union[list, dict], count: int) -> None: ...
+
     @abstractmethod
     def add_data(self, data): ...
 
     @abstractmethod
-    def _record(self): ...
+    def _record(self, data: Union[list, dict]): ...
 
 
 class BaseRecorder(OriginalRecorder):
@@ -78,4 +115,10 @@ class BaseRecorder(OriginalRecorder):
     def encoding(self) -> str: ...
 
     @abstractmethod
-    def _record(self): ...
+    def _record(self, data: Union[list, dict]): ...
+
+
+def _write_batches(recorder_ref: ReferenceType) -> None: ...
+
+
+def _close_async_recorders() -> None: ...
@@ -1,52 +1,528 @@
 # -*- coding:utf-8 -*-
+from bisect import bisect_left, bisect_right
+from os import open as os_open, close, fstat, ftruncate, replace, O_RDWR, O_CREAT
 from pathlib import Path
-from time import sleep
+from threading import Lock
 
 from .base import OriginalRecorder
+from .setter import ByteSetter
+
+try:
+    from os import writev as _writev, sysconf
+    _IOV_MAX = sysconf('SC_IOV_MAX')
+except (ImportError, ValueError, OSError):  # Windows等不支持writev()的系统
+    _writev = None
+    _IOV_MAX = 1024
+try:
+    from os import pwrite as _pwrite
+except ImportError:
+    _pwrite = None
+try:
+    from os import posix_fallocate as _fallocate
+except ImportError:
+    _fallocate = None
+_JOIN_SIZE = 1 << 24  # 不支持writev()时，每次拼接写入的最大字节数
+_SMALL = 1 << 12  # 小于此字节数的相邻片段先拼接再交给writev()
+_PACK_SIZE = 1 << 16  # 小片段拼接后的目标字节数
+_JOURNAL_BATCH = 1024  # 直接写入的范围积累到多少条时追加到日志文件
 
 
 class ByteRecorder(OriginalRecorder):
     SUPPORTS = ('any',)
-    __END = (0, 2)
 
-    def __init__(self, path=None, cache_size=None):
+    def __init__(self, path=None, cache_size=None, cache_bytes=None):
         """用于记录字节数据的工具
         :param path: 保存的文件路径
         :param cache_size: 每接收多少条记录写入文件，0为不自动写入
+        :param cache_bytes: 缓存数据达到多少字节时写入文件，与cache_size先达到的一个触发写入，0或None为不限
         """
+        self._cache_bytes = cache_bytes or 0
+        self._data_bytes = 0  # 缓存中数据的字节数
+        self._pending_bytes = 0  # 已添加但未写入文件的字节数，包括等待后台线程写入的
+        self._peak_bytes = 0  # _pending_bytes的最大值
+        self._direct = False  # 指定了seek的数据是否直接写入文件
+        self._fd = None  # 直接写入使用的文件描述符，各线程共用
+        self._fd_lock = Lock()  # 只在打开文件描述符时使用
+        self._total_size = None  # 文件的最终大小，设置后预先分配空间
+        self._filled = Ranges()  # 已写入文件的字节范围
+        self._filled_lock = Lock()  # 保护_filled和_journal_pending，持有时不读写文件
+        self._journal = False  # 是否把已写入的范围记录到日志文件，用于断点续传
+        self._journal_lines = 0  # 日志文件的行数，过多时压缩
+        self._journal_pending = []  # 已写入文件但还没有记录到日志文件的范围
+        self._journal_lock = Lock()  # 保证同一时间只有一个线程写日志文件
         super().__init__(path, cache_size)
 
+    def __del__(self):
+        """对象关闭时把剩下的数据写入文件，并关闭直接写入使用的文件"""
+        super().__del__()
+        self._close_fd()
+
+    @property
+    def set(self):
+        """返回用于设置属性的对象"""
+        if self._setter is None:
+            self._setter = ByteSetter(self)
+        return self._setter
+
+    @property
+    def cache_bytes(self):
+        """返回缓存字节数上限，0为不限"""
+        return self._cache_bytes
+
+    @property
+    def peak_bytes(self):
+        """返回已添加但未写入文件的数据曾达到的最大字节数，包括等待后台线程写入的"""
+        return self._peak_bytes
+
+    @property
+    def total_size(self):
+        """返回设置的文件最终大小，None为未设置"""
+        return self._total_size
+
+    @property
+    def filled_ranges(self):
+        """返回本对象已写入文件的字节范围，格式为[(开始位置, 结束位置), ...]，相连的范围会合并"""
+        with self._filled_lock:
+            return list(self._filled)
+
+    @property
+    def journal_path(self):
+        """返回记录已写入范围的日志文件路径"""
+        return f'{self._path}.ranges' if self._path else None
+
+    def missing_ranges(self):
+        """返回文件中还没有写入的字节范围，用于断点续传
+        :return: 格式为[(开始位置, 结束位置), ...]，未设置total_size时只返回已写入范围之间的空隙
+        """
+        with self._filled_lock:
+            return self._filled.missing(self._total_size)
+
     def add_data(self, data, seek=None):
         """添加一段二进制数据
         :param data: bytes类型数据
         :param seek: 在文件中的位置，None表示最后
         :return: None
         """
-        while self._pause_add:  # 等待其它线程写入结束
-            sleep(.1)
-
         if not isinstance(data, bytes):
             raise TypeError('只能接受bytes类型数据。')
         if seek is not None and not (isinstance(seek, int) and seek >= 0):
             raise ValueError('seek参数只能接受None或大于等于0的整数。')
+        if seek is not None and self._total_size is not None and seek + len(data) > self._total_size:
+            raise ValueError(f'数据超出设置的文件大小{self._total_size}。')
+
+        if seek is not None and self._direct and _pwrite is not None:  # 不经缓存和锁，直接写入指定位置
+            fd = self._get_fd()
+            start = seek
+            view = memoryview(data)
+            while view:
+                n = _pwrite(fd, view, seek)
+                view = view[n:]
+                seek += n
+            if self._mark_filled(((start, seek),)):
+                self._write_journal()
+            return
+
+        size = len(data)
+        with self._lock:
+            self._data.append((data, seek))
+            self._data_count += 1
+            self._data_bytes += size
+            self._pending_bytes += size
+            if self._pending_bytes > self._peak_bytes:
+                self._peak_bytes = self._pending_bytes
+
+        self._check_cache()
 
-        self._data.append((data, seek))
-        self._data_count += 1
+    def record(self, new_path=None):
+        """记录数据，可保存到新文件，开启日志时把直接写入的范围一并记录到日志文件
+        :param new_path: 文件另存为的路径，会保存新文件
+        :return: 文件路径
+        """
+        path = super().record(new_path)
+        self._write_journal()
+        return path
+
+    def flush(self, wait=True):
+        """把缓存中的数据写入文件，开启异步写入时交给后台线程写入，等待写入完成时把直接写入的范围记录到日志文件
+        :param wait: 是否等待数据写入完成，为False时不阻塞，只在开启异步写入时有效
+        :return: None
+        """
+        super().flush(wait)
+        if wait:
+            self._write_journal()
 
-        if 0 < self.cache_size <= self._data_count:
-            self.record()
+    def clear(self):
+        """清空缓存中的数据"""
+        with self._lock:
+            if self._data:
+                self._data.clear()
+            self._data_count = 0
+            self._pending_bytes -= self._data_bytes
+            self._data_bytes = 0
 
-    def _record(self):
-        """记录数据到文件"""
+    def _record(self, data):
+        """记录数据到文件，先在内存中合并相连和重叠的写入，每段连续数据只定位一次
+        :param data: 要写入的数据列表
+        :return: None
+        """
         if not Path(self.path).exists():
             with open(self.path, 'w'):
                 pass
 
-        with open(self.path, 'rb+') as f:
-            previous = None
-            for i in self._data:
-                loc = ByteRecorder.__END if i[1] is None else (i[1], 0)
-                if not (previous == loc == ByteRecorder.__END):
-                    f.seek(loc[0], loc[1])
-                    previous = loc
-                f.write(i[0])
+        total = self._total_size
+        with open(self.path, 'rb+', buffering=0) as f:
+            if total is None:
+                segments = _merge_writes(data, f.seek(0, 2))
+
+            else:  # 未指定seek的数据接在已写入的最远位置后面
+                with self._filled_lock:
+                    end = self._filled.end
+                segments = _merge_writes(data, end)
+                if segments and segments[-1][0] + sum(len(i) for i in segments[-1][1]) > total:
+                    raise ValueError(f'数据超出设置的文件大小{total}。')
+                _allocate(f.fileno(), total)
+
+            for start, pieces in segments:
+                f.seek(start)
+                _write_pieces(f, pieces)
+
+        self._mark_filled([(start, start + sum(len(i) for i in pieces)) for start, pieces in segments])
+        self._write_journal()
+
+        size = sum(len(i[0]) for i in data)
+        with self._lock:
+            self._pending_bytes -= size
+
+    def _check_cache(self):
+        """缓存数据达到cache_size或cache_bytes时写入文件，开启异步写入时交给后台线程"""
+        if 0 < self._cache <= self._data_count or 0 < self._cache_bytes <= self._data_bytes:
+            if self._use_writer():
+                self.flush(wait=False)
+            else:
+                self.record()
+
+    def _take(self):
+        """取出缓存中的数据并换上空缓存
+        :return: 取出的数据和条数
+        """
+        with self._lock:
+            data, count = self._data, self._data_count
+            if data:
+                self._data = []
+                self._data_count = 0
+                self._data_bytes = 0
+            return data, count
+
+    def _restore(self, data, count):
+        """把未能写入的数据放回缓存最前面，调用前须持有self._lock
+        :param data: 未写入的数据
+        :param count: 数据条数
+        :return: None
+        """
+        super()._restore(data, count)
+        self._data_bytes = sum(len(i[0]) for i in self._data)
+
+    def _mark_filled(self, ranges):
+        """记录已写入文件的范围，开启日志时放入待记录列表，由_write_journal()成批追加到日志文件
+        :param ranges: (开始位置, 结束位置)组成的列表
+        :return: 待记录的范围是否已积累到须写入日志文件的条数
+        """
+        with self._filled_lock:
+            for start, end in ranges:
+                self._filled.add(start, end)
+            if not self._journal:
+                return False
+            self._journal_pending.extend(ranges)
+            return len(self._journal_pending) >= _JOURNAL_BATCH
+
+    def _write_journal(self):
+        """把待记录的范围追加到日志文件，行数过多时只保留合并后的范围"""
+        with self._journal_lock:
+            with self._filled_lock:
+                pending, self._journal_pending = self._journal_pending, []
+                if not pending:
+                    return
+                lines = self._journal_lines + len(pending)
+                compact = lines > max(64, len(self._filled) * 4)
+                ranges = list(self._filled) if compact else pending
+
+            try:
+                if compact:
+                    tmp = f'{self.journal_path}.tmp'
+                    with open(tmp, 'w') as f:
+                        f.writelines(f'{start} {end - start}\n' for start, end in ranges)
+                    replace(tmp, self.journal_path)
+                    lines = len(ranges)
+                else:
+                    with open(self.journal_path, 'a') as f:
+                        f.writelines(f'{start} {end - start}\n' for start, end in ranges)
+
+            except Exception:
+                with self._filled_lock:
+                    self._journal_pending[:0] = pending
+                raise
+            self._journal_lines = lines
+
+    def _reset_filled(self):
+        """清空已写入范围，开启日志时从日志文件读取上次记录的范围"""
+        with self._journal_lock, self._filled_lock:
+            self._filled.clear()
+            self._journal_pending = []
+            self._journal_lines = 0
+            if not self._journal or not self._path:
+                return
+
+            journal = Path(self.journal_path)
+            if not journal.exists():
+                return
+            if not Path(self._path).exists():  # 数据文件已不存在，日志失效
+                journal.unlink()
+                return
+
+            size = Path(self._path).stat().st_size
+            with open(journal) as f:
+                for line in f:
+                    line = line.split()
+                    if len(line) != 2 or not (line[0].isdigit() and line[1].isdigit()):
+                        continue  # 进程中断时可能只写入了半行
+                    start = int(line[0])
+                    self._filled.add(start, min(start + int(line[1]), size))
+                    self._journal_lines += 1
+
+    def _get_fd(self):
+        """返回直接写入使用的文件描述符，未打开时打开文件
+        :return: 文件描述符
+        """
+        fd = self._fd
+        if fd is None:
+            with self._fd_lock:
+                if self._fd is None:
+                    if not self._path:
+                        raise ValueError('保存路径为空。')
+                    Path(self._path).parent.mkdir(parents=True, exist_ok=True)
+                    fd = os_open(self._path, O_RDWR | O_CREAT, 0o666)
+                    if self._total_size is not None:
+                        _allocate(fd, self._total_size)
+                    self._fd = fd
+                fd = self._fd
+        return fd
+
+    def _close_fd(self):
+        """关闭直接写入使用的文件描述符"""
+        with self._fd_lock:
+            if self._fd is not None:
+                close(self._fd)
+                self._fd = None
+
+
+class Ranges(object):
+    def __init__(self):
+        """记录多个字节范围，相连或重叠的范围自动合并"""
+        self._starts = []  # 各范围开始位置，已排序
+        self._ends = []  # 各范围结束位置（不含），已排序
+
+    def __iter__(self):
+        return zip(self._starts, self._ends)
+
+    def __len__(self):
+        return len(self._starts)
+
+    @property
+    def end(self):
+        """返回最远的结束位置，没有范围时返回0"""
+        return self._ends[-1] if self._ends else 0
+
+    def clear(self):
+        """清空所有范围"""
+        self._starts.clear()
+        self._ends.clear()
+
+    def add(self, start, end):
+        """添加一个范围
+        :param start: 开始位置
+        :param end: 结束位置（不含）
+        :return: None
+        """
+        if start >= end:
+            return
+        i = bisect_left(self._ends, start)  # 第一个与之相连的范围
+        j = bisect_right(self._starts, end)  # 最后一个与之相连的范围之后
+        if i < j:
+            start = min(start, self._starts[i])
+            end = max(end, self._ends[j - 1])
+        self._starts[i:j] = [start]
+        self._ends[i:j] = [end]
+
+    def missing(self, total=None):
+        """返回各范围之间的空隙
+        :param total: 总长度，不为None时包括最后一个范围到总长度之间的空隙
+        :return: 格式为[(开始位置, 结束位置), ...]
+        """
+        result = []
+        pos = 0
+        for start, end in self:
+            if start > pos:
+                result.append((pos, start))
+            pos = end
+        if total is not None and total > pos:
+            result.append((pos, total))
+        return result
+
+
+def _allocate(fd, size):
+    """把文件扩展到指定大小并预先分配磁盘空间，不支持预分配时只扩展文件大小
+    :param fd: 文件描述符
+    :param size: 文件大小
+    :return: None
+    """
+    current = fstat(fd).st_size
+    if current >= size:
+        return
+    if _fallocate is not None:
+        try:
+            _fallocate(fd, current, size - current)
+            return
+        except OSError:  # 文件系统不支持时使用truncate
+            pass
+    ftruncate(fd, size)
+
+
+def _merge_writes(data, size):
+    """按写入顺序计算每段数据的位置，把相连的数据合并为一段，重叠部分以后写入的为准
+    :param data: (数据, 位置)组成的列表，位置为None表示文件末尾
+    :param size: 写入前的文件大小
+    :return: (开始位置, 数据片段列表)组成的列表，按位置排序且互不相连
+    """
+    starts = []  # 各段开始位置，用于二分查找
+    segments = []  # 各段数据，格式为[开始位置, 结束位置, 数据片段列表]
+    num = -1  # 上一次写入所在段的序号
+    for piece, seek in data:
+        if not piece:
+            continue
+        start = size if seek is None else seek
+        end = start + len(piece)
+        if end > size:
+            size = end
+
+        if num >= 0 and segments[num][1] == start and (num + 1 == len(starts) or starts[num + 1] > end):
+            seg = segments[num]  # 接在上一次写入的后面，最常见的情况
+            seg[1] = end
+            seg[2].append(piece)
+            continue
+
+        first = bisect_right(starts, start) - 1
+        if first < 0 or segments[first][1] < start:
+            first += 1
+        last = bisect_right(starts, end) - 1
+        num = first
+        if first > last:  # 不与任何段相连
+            starts.insert(first, start)
+            segments.insert(first, [start, end, [piece]])
+            continue
+
+        seg = segments[first]
+        if first == last and seg[1] == start:  # 接在一段后面
+            seg[1] = end
+            seg[2].append(piece)
+            continue
+
+        tail = segments[last]
+        pieces = _cut_pieces(seg[0], seg[2], seg[0], start)
+        pieces.append(piece)
+        pieces.extend(_cut_pieces(tail[0], tail[2], end, tail[1]))
+        new_start = min(seg[0], start)
+        starts[first:last + 1] = [new_start]
+        segments[first:last + 1] = [[new_start, max(tail[1], end), pieces]]
+
+    return [(i[0], i[2]) for i in segments]
+
+
+def _cut_pieces(start, pieces, lo, hi):
+    """从一段数据中截取指定范围，不复制数据
+    :param start: 该段数据的开始位置
+    :param pieces: 该段数据的片段列表
+    :param lo: 截取的开始位置
+    :param hi: 截取的结束位置
+    :return: 截取到的片段列表
+    """
+    result = []
+    for piece in pieces:
+        end = start + len(piece)
+        if end > lo and start < hi:
+            if lo <= start and end <= hi:
+                result.append(piece)
+            else:
+                result.append(memoryview(piece)[max(lo - start, 0):min(hi, end) - start])
+        start = end
+    return result
+
+
+def _write_pieces(f, pieces):
+    """把多个数据片段连续写入文件，支持时用一次writev()系统调用写入多个片段
+    :param f: 以无缓冲方式打开的文件对象，已定位到写入位置
+    :param pieces: 数据片段列表
+    :return: None
+    """
+    if len(pieces) == 1:
+        _write_all(f, pieces[0])
+        return
+
+    if _writev is None:  # 不支持writev()时分组拼接后写入，控制额外占用的内存
+        group, size = [], 0
+        for piece in pieces:
+            group.append(piece)
+            size += len(piece)
+            if size >= _JOIN_SIZE:
+                _write_all(f, b''.join(group))
+                group, size = [], 0
+        if group:
+            _write_all(f, b''.join(group))
+        return
+
+    pieces = _pack_pieces(pieces)
+    fd = f.fileno()
+    for i in range(0, len(pieces), _IOV_MAX):
+        group = pieces[i:i + _IOV_MAX]
+        left = sum(len(p) for p in group) - _writev(fd, group)
+        if left:  # 只写入了一部分，剩下的拼接后补写
+            _write_all(f, b''.join(group)[-left:])
+
+
+def _pack_pieces(pieces):
+    """把相邻的小片段拼接为约_PACK_SIZE字节的片段，大片段保持不变，减少writev()的次数
+    :param pieces: 数据片段列表
+    :return: 新的片段列表
+    """
+    result = []
+    group, size = [], 0
+    for piece in pieces:
+        if len(piece) < _SMALL:
+            group.append(piece)
+            size += len(piece)
+            if size < _PACK_SIZE:
+                continue
+        elif group:
+            result.append(group[0] if len(group) == 1 else b''.join(group))
+            result.append(piece)
+            group, size = [], 0
+            continue
+        else:
+            result.append(piece)
+            continue
+        result.append(b''.join(group))
+        group, size = [], 0
+
+    if group:
+        result.append(group[0] if len(group) == 1 else b''.join(group))
+    return result
+
+
+def _write_all(f, data):
+    """把数据完整写入无缓冲的文件对象，处理只写入一部分的情况
+    :param f: 以无缓冲方式打开的文件对象
+    :param data: 要写入的数据
+    :return: None
+    """
+    view = memoryview(data)
+    while view:
+        view = view[f.write(view):]
@@ -1,22 +1,131 @@
 # -*- coding:utf-8 -*-
 from pathlib import Path
-from typing import Union, Optional
+from threading import Lock
+from typing import Union, Optional, List, Tuple, Callable, Iterable, Iterator
 
 from .base import OriginalRecorder
+from .setter import ByteSetter
 
 
 class ByteRecorder(OriginalRecorder):
     SUPPORTS: tuple = ...
-    __END: tuple = ...
+    _cache_bytes: int = ...
+    _data_bytes: int = ...
+    _pending_bytes: int = ...
+    _peak_bytes: int = ...
+    _direct: bool = ...
+    _fd: Optional[int] = ...
+    _fd_lock: Lock = ...
+    _total_size: Optional[int] = ...
+    _filled: Ranges = ...
+    _filled_lock: Lock = ...
+    _journal: bool = ...
+    _journal_lines: int = ...
+    _journal_pending: List[Tuple[int, int]] = ...
+    _journal_lock: Lock = ...
+    _setter: Optional[ByteSetter] = ...
     _data: list = ...
     data: list = ...
 
     def __init__(self,
                  path: Optional[str, Path] = None,
-                 cache_size: int = None): ...
+                 cache_size: int = None,
+                 cache_bytes: int = None): ...
+
+    def __del__(self) -> None: ...
+
+    @property
+    def set(self) -> ByteSetter: ...
+
+    @property
+    def cache_bytes(self) -> int: ...
+
+    @property
+    def peak_bytes(self) -> int: ...
+
+    @property
+    def total_size(self) -> Optional[int]: ...
+
+    @property
+    def filled_ranges(self) -> List[Tuple[int, int]]: ...
+
+    @property
+    def journal_path(self) -> Optional[str]: ...
+
+    def missing_ranges(self) -> List[Tuple[int, int]]: ...
 
     def add_data(self,
                  data: bytes,
                  seek: int = None) -> None: ...
 
-    def _record(self) -> None: ...
+    def record(self, new_path: Optional[str, Path] = None) -> str: ...
+
+    def flush(self, wait: bool = True) -> None: ...
+
+    def clear(self) -> None: ...
+
+    def _record(self, data: list) -> None: ...
+
+    def _check_cache(self) -> None: ...
+
+    def _take(self) -> Tuple[list, int]: ...
+
+    def _restore(self, data: list, count: int) -> None: ...
+
+    def _mark_filled(self, ranges: Iterable[Tuple[int, int]]) -> bool: ...
+
+    def _write_journal(self) -> None: ...
+
+    def _reset_filled(self) -> None: ...
+
+    def _get_fd(self) -> int: ...
+
+    def _close_fd(self) -> None: ...
+
+
+_writev: Optional[Callable] = ...
+_IOV_MAX: int = ...
+_JOIN_SIZE: int = ...
+_SMALL: int = ...
+_PACK_SIZE: int = ...
+_JOURNAL_BATCH: int = ...
+_pwrite: Optional[Callable] = ...
+_fallocate: Optional[Callable] = ...
+
+
+class Ranges(object):
+    _starts: List[int] = ...
+    _ends: List[int] = ...
+
+    def __init__(self): ...
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]: ...
+
+    def __len__(self) -> int: ...
+
+    @property
+    def end(self) -> int: ...
+
+    def clear(self) -> None: ...
+
+    def add(self, start: int, end: int) -> None: ...
+
+    def missing(self, total: Optional[int] = None) -> List[Tuple[int, int]]: ...
+
+
+def _allocate(fd: int, size: int) -> None: ...
+
+
+def _merge_writes(data: Iterable[Tuple[bytes, Optional[int]]], size: int) -> List[Tuple[int, list]]: ...
+
+
+def _cut_pieces(start: int, pieces: list, lo: int, hi: int) -> list: ...
+
+
+def _write_pieces(f, pieces: list) -> None: ...
+
+
+def _pack_pieces(pieces: list) -> list: ...
+
+
+def _write_all(f, data: Union[bytes, bytearray, memoryview]) -> None: ...
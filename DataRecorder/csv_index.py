@@ -0,0 +1,286 @@
+# -*- coding:utf-8 -*-
+from array import array
+from csv import reader as csv_reader, writer as csv_writer
+from io import StringIO
+from os import stat
+from pathlib import Path
+from re import compile, escape
+
+_CHUNK = 1 << 20
+_VERSION = b'1'  # 索引文件格式版本，版本不同的索引重新建立
+
+
+class CsvIndex(object):
+    def __init__(self, path, encoding='utf-8', delimiter=',', quote_char='"'):
+        """记录csv文件每行起始字节位置的索引，保存在同名.idx文件中，用于只读写需要的行
+        :param path: csv文件路径
+        :param encoding: 文件编码，须兼容ascii
+        :param delimiter: 分隔符
+        :param quote_char: 引用符
+        """
+        self.path = str(path)
+        self.index_path = f'{self.path}.idx'
+        self.encoding = encoding
+        self.delimiter = delimiter
+        self.quote_char = quote_char
+        self._offsets = None  # 每行起始位置，最后一个值为文件大小
+        self._stamp = None  # 建立索引时文件的(大小, 修改时间)
+
+    @staticmethod
+    def usable(encoding):
+        """返回编码是否可用索引（换行符和引用符须为单字节ascii）
+        :param encoding: 文件编码
+        :return: bool
+        """
+        return '\r\n"\','.encode(encoding) == b'\r\n"\','
+
+    @property
+    def rows_count(self):
+        """返回文件行数"""
+        self._check()
+        return len(self._offsets) - 1
+
+    def lines(self):
+        """返回按需读取行的CsvLines对象，修改后调用其commit()方法写入文件
+        :return: CsvLines对象
+        """
+        self._check()
+        return CsvLines(self)
+
+    def read_row(self, num, f=None):
+        """读取一行数据
+        :param num: 行号，从1开始
+        :param f: 已用'rb'模式打开的文件对象，为None时自动打开
+        :return: 该行各列值组成的列表
+        """
+        start, end = self._offsets[num - 1], self._offsets[num]
+        if f is None:
+            with open(self.path, 'rb') as f:
+                f.seek(start)
+                raw = f.read(end - start)
+        else:
+            f.seek(start)
+            raw = f.read(end - start)
+        return next(csv_reader(StringIO(raw.decode(self.encoding), newline=''),
+                               delimiter=self.delimiter, quotechar=self.quote_char), [])
+
+    def build(self):
+        """扫描整个文件建立索引并保存，按csv.reader的规则判断引用：只有字段开头的引用符开始引用，
+        引用中连续两个引用符表示一个引用符，引用外的\r、\n和\r\n都是行尾"""
+        offsets = array('Q', [0])
+        quote = self.quote_char.encode(self.encoding)
+        starts = (self.delimiter.encode(self.encoding), b'\n', b'\r')  # 其后为字段开头
+        pattern = compile(b'[\r\n' + escape(quote) + b']')
+        in_quote = False
+        closed = -2  # 最后一个结束引用的引用符位置
+        cr = None  # 上一块末尾未判断是否\r\n的\r位置
+        pos = 0
+        tail = b''  # 上一块末尾的数据，用于判断引用符前面的内容
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(_CHUNK)
+                if not chunk:
+                    break
+                if cr is not None:
+                    if chunk[:1] != b'\n':
+                        offsets.append(cr + 1)
+                    cr = None
+
+                buf = tail + chunk
+                base = pos - len(tail)
+                for m in pattern.finditer(buf, len(tail)):
+                    i = m.start()
+                    c = m.group()
+                    if c == quote:
+                        if in_quote:
+                            in_quote = False
+                            closed = base + i
+                        elif base + i == 0 or base + i - 1 == closed or buf.endswith(starts, 0, i):
+                            in_quote = True
+                    elif in_quote:
+                        continue
+                    elif c == b'\n':
+                        offsets.append(base + i + 1)
+                    elif i + 1 == len(buf):  # \r在块末尾，下一块开头是否\n时才能判断
+                        cr = base + i
+                    elif buf[i + 1:i + 2] != b'\n':
+                        offsets.append(base + i + 1)
+
+                pos += len(chunk)
+                tail = buf[-8:]
+
+        if offsets[-1] != pos:  # 最后一行没有换行符
+            offsets.append(pos)
+        self._offsets = offsets
+        self._save()
+
+    def _check(self):
+        """检查文件是否被外部修改，是则重新加载或建立索引"""
+        if not Path(self.path).exists():
+            with open(self.path, 'w', encoding=self.encoding):
+                pass
+
+        stamp = _get_stamp(self.path)
+        if self._offsets is not None and self._stamp == stamp:
+            return
+
+        if Path(self.index_path).exists():
+            with open(self.index_path, 'rb') as f:
+                head = f.readline().split()
+                if len(head) == 4 and head[0] == _VERSION and (int(head[1]), int(head[2])) == stamp:
+                    offsets = array('Q')
+                    offsets.frombytes(f.read())
+                    if len(offsets) == int(head[3]):
+                        self._offsets = offsets
+                        self._stamp = stamp
+                        return
+
+        self.build()
+
+    def _save(self):
+        """保存索引到文件"""
+        self._stamp = _get_stamp(self.path)
+        with open(self.index_path, 'wb') as f:
+            f.write(_VERSION + f' {self._stamp[0]} {self._stamp[1]} {len(self._offsets)}\n'.encode())
+            f.write(self._offsets.tobytes())
+
+    def _dump(self, row):
+        """把一行数据转为csv格式的bytes
+        :param row: 行数据
+        :return: bytes
+        """
+        s = StringIO(newline='')
+        csv_writer(s, delimiter=self.delimiter, quotechar=self.quote_char).writerow(row)
+        return s.getvalue().encode(self.encoding)
+
+
+class CsvLines(object):
+    def __init__(self, index):
+        """按需从文件读取行的列表，可被当作所有行组成的列表使用
+        :param index: CsvIndex对象
+        """
+        self._index = index
+        self._file_rows = index.rows_count
+        self._count = self._file_rows
+        self._rows = {}  # 已读取或新增的行，key从0开始
+        self._origin = {}  # 读取时的原始数据，用于判断是否被修改
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, item):
+        if item < 0:
+            item += self._count
+        if not 0 <= item < self._count:
+            raise IndexError('行号超出范围。')
+
+        if item not in self._rows:
+            row = self._index.read_row(item + 1)
+            self._rows[item] = row
+            self._origin[item] = list(row)
+        return self._rows[item]
+
+    def append(self, row):
+        """在末尾添加一行
+        :param row: 行数据
+        :return: None
+        """
+        self._rows[self._count] = row
+        self._count += 1
+
+    def commit(self):
+        """把修改过的行写入文件，新增行直接追加。修改前后字节数相同时只覆盖第一个到最后一个被修改的行之间的部分，
+        字节数改变时还要把其后直到文件末尾的内容整体移动，读写量与该位置之后的文件大小成正比"""
+        index = self._index
+        offsets = index._offsets
+        changed = sorted(k for k in self._rows if k < self._file_rows and self._rows[k] != self._origin[k])
+        changed_set = set(changed)
+        added = [index._dump(self._rows.get(k, [])) for k in range(self._file_rows, self._count)]
+        if not changed and not added:
+            return
+
+        with open(index.path, 'rb+') as f:
+            if changed:
+                lo, hi = changed[0], changed[-1] + 1
+                start, end = offsets[lo], offsets[hi]
+                f.seek(start)
+                old = f.read(end - start)
+                parts = []
+                for k in range(lo, hi):
+                    if k in changed_set:
+                        parts.append(index._dump(self._rows[k]))
+                    else:
+                        parts.append(old[offsets[k] - start:offsets[k + 1] - start])
+
+                new = b''.join(parts)
+                delta = len(new) - len(old)
+                if delta:
+                    _shift(f, end, offsets[-1], delta)
+                f.seek(start)
+                f.write(new)
+                if delta < 0:
+                    f.truncate(offsets[-1] + delta)
+
+                pos = start
+                for k, part in enumerate(parts, lo + 1):
+                    pos += len(part)
+                    offsets[k] = pos
+                if delta:
+                    for k in range(hi + 1, len(offsets)):
+                        offsets[k] += delta
+
+            if added:
+                end = offsets[-1]
+                if end:
+                    f.seek(end - 1)
+                    if f.read(1) != b'\n':  # 最后一行没有换行符
+                        sep = index._dump([])
+                        f.write(sep)
+                        offsets[-1] = end = end + len(sep)
+                f.seek(end)
+                for row in added:
+                    f.write(row)
+                    end += len(row)
+                    offsets.append(end)
+
+        index._save()
+        self._file_rows = self._count
+        self._origin = {k: list(v) for k, v in self._rows.items()}
+
+
+def _get_stamp(path):
+    """返回文件大小和修改时间
+    :param path: 文件路径
+    :return: (大小, 修改时间)
+    """
+    s = stat(path)
+    return s.st_size, s.st_mtime_ns
+
+
+def _shift(f, start, end, delta):
+    """把文件中一段数据整体移动
+    :param f: 以'rb+'模式打开的文件对象
+    :param start: 数据开始位置
+    :param end: 数据结束位置
+    :param delta: 移动的距离，正数向后，负数向前
+    :return: None
+    """
+    if delta > 0:  # 向后移动时从末尾开始复制，避免覆盖未复制的数据
+        pos = end
+        while pos > start:
+            size = min(_CHUNK, pos - start)
+            pos -= size
+            f.seek(pos)
+            chunk = f.read(size)
+            f.seek(pos + delta)
+            f.write(chunk)
+
+    else:
+        pos = start
+        while pos < end:
+            size = min(_CHUNK, end - pos)
+            f.seek(pos)
+            chunk = f.read(size)
+            f.seek(pos + delta)
+            f.write(chunk)
+            pos += size
@@ -0,0 +1,59 @@
+# -*- coding:utf-8 -*-
+from array import array
+from pathlib import Path
+from typing import Union, Optional, Tuple, BinaryIO, List, Any
+
+
+class CsvIndex(object):
+    path: str = ...
+    index_path: str = ...
+    encoding: str = ...
+    delimiter: str = ...
+    quote_char: str = ...
+    _offsets: Optional[array] = ...
+    _stamp: Optional[Tuple[int, int]] = ...
+
+    def __init__(self, path: Union[str, Path], encoding: str = 'utf-8', delimiter: str = ',',
+                 quote_char: str = '"') -> None: ...
+
+    @staticmethod
+    def usable(encoding: str) -> bool: ...
+
+    @property
+    def rows_count(self) -> int: ...
+
+    def lines(self) -> CsvLines: ...
+
+    def read_row(self, num: int, f: Optional[BinaryIO] = None) -> List[str]: ...
+
+    def build(self) -> None: ...
+
+    def _check(self) -> None: ...
+
+    def _save(self) -> None: ...
+
+    def _dump(self, row: list) -> bytes: ...
+
+
+class CsvLines(object):
+    _index: CsvIndex = ...
+    _file_rows: int = ...
+    _count: int = ...
+    _rows: dict = ...
+    _origin: dict = ...
+
+    def __init__(self, index: CsvIndex) -> None: ...
+
+    def __len__(self) -> int: ...
+
+    def __getitem__(self, item: int) -> list: ...
+
+    def append(self, row: list) -> None: ...
+
+    def commit(self) -> None: ...
+
+
+def _get_stamp(path: Union[str, Path]) -> Tuple[int, int]: ...
+
+
+def _shift(f: BinaryIO, start: int, end: int, delta: int) -> None: ...
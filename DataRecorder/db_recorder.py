@@ -1,15 +1,29 @@
 # -*- coding:utf-8 -*-
+from itertools import chain
 from pathlib import Path
-from sqlite3 import connect
-from time import sleep
+from re import compile, escape, IGNORECASE
+from sqlite3 import connect, sqlite_version_info
+from threading import current_thread
+from time import perf_counter
 
 from .base import BaseRecorder
 from .setter import DBSetter
-from .tools import data_to_list_or_dict, ok_list
+from .tools import data_to_list_or_dict, process_content
+
+_DDL = compile(r'\s*(CREATE|ALTER|DROP)\b', IGNORECASE)
+_NATIVE = {int, float, str, bytes, bool, type(None)}  # 可直接交给sqlite3的类型
 
 
 class DBRecorder(BaseRecorder):
     SUPPORTS = ('db',)
+    PROFILES = {  # set.performance()可用的预设
+        'default': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'cache_size': -2000, 'mmap_size': 0,
+                    'temp_store': 'DEFAULT'},
+        'durable': {'journal_mode': 'WAL', 'synchronous': 'FULL', 'cache_size': -16000, 'mmap_size': 0,
+                    'temp_store': 'DEFAULT'},
+        'bulk': {'journal_mode': 'WAL', 'synchronous': 'OFF', 'cache_size': -64000, 'mmap_size': 256 << 20,
+                 'temp_store': 'MEMORY'},
+    }
 
     def __init__(self, path=None, cache_size=None, table=None):
         """用于存储数据到sqlite的工具
@@ -19,6 +33,18 @@ class DBRecorder(BaseRecorder):
         """
         self._conn = None
         self._cur = None
+        self._writer_conn = None  # 后台写入线程使用的连接
+        self._tables = None  # 缓存的数据表和列名，None表示需要重新读取
+        self._pragmas = {}  # 连接数据库时执行的PRAGMA设置
+        self._upsert_keys = {}  # 各表用于判断重复数据的列，格式为{表名: 列名元组}
+        self._indexed = set()  # 已确认建立唯一索引的表
+        self._schemas = {}  # 各表指定的列类型，格式为{表名: {列名: 类型}}
+        self._indexes = {}  # 各表要建立的索引，格式为{表名: [列名元组, ...]}
+        self._index_ready = set()  # 已确认建立所有索引的表
+        self._defer_index = False  # 是否在写入时不维护索引，到record()时再建立
+        self._deferred = set()  # 已删除索引、等待建立索引的表
+        self._index_times = {}  # 最近一次建立各索引的用时
+        self._sql_cache = {}  # 按(表名, 列名, 唯一键)缓存的写入语句
         self._type = 'db'
         super().__init__(None, cache_size)
         if path:
@@ -31,20 +57,58 @@ class DBRecorder(BaseRecorder):
             self._setter = DBSetter(self)
         return self._setter
 
+    @property
+    def index_times(self):
+        """返回最近一次建立各索引的用时，格式为{索引名: 秒数}"""
+        return dict(self._index_times)
+
     def __del__(self):
         """重写父类方法"""
         super().__del__()
         self._close_connection()
 
+    def record(self, new_path=None):
+        """记录数据，可保存到新文件，开启延迟建立索引时，写入后建立索引
+        :param new_path: 文件另存为的路径，会保存新文件
+        :return: 文件路径
+        """
+        path = super().record(new_path)
+        if self._deferred and not new_path:
+            self.build_indexes()
+        return path
+
+    def flush(self, wait=True):
+        """重写父类方法，等待写入完成时建立延迟建立的索引
+        :param wait: 是否等待数据写入完成，为False时不阻塞，只在开启异步写入时有效
+        :return: None
+        """
+        super().flush(wait)
+        if wait and self._deferred:
+            self.build_indexes()
+
+    def build_indexes(self):
+        """建立延迟建立的索引
+        :return: None
+        """
+        if not self._deferred or self._conn is None:
+            return
+
+        self._begin_write()
+        try:
+            tables = self._get_tables(self._cur)
+            for table in list(self._deferred):
+                self._create_indexes(table, tables, self._cur)
+                self._deferred.discard(table)
+            self._conn.commit()
+        finally:
+            self._end_write()
+
     def add_data(self, data, table=None):
         """添加数据
         :param data: 可以是一维或二维数据，dict格式可向对应列填写数据，其余格式按顺序从左到右填入各列
         :param table: 数据要插入的表名称
         :return: None
         """
-        while self._pause_add:  # 等待其它线程写入结束
-            sleep(.1)
-
         table = table or self.table
         if not isinstance(table, str):
             raise RuntimeError('未指定数据库表名。')
@@ -53,119 +117,385 @@ class DBRecorder(BaseRecorder):
             data = (data,)
 
         if not data:
-            self._data.setdefault(table, []).append(tuple())
-            self._data_count += 1
+            data = [tuple()]
 
         # 一维数组
         elif isinstance(data, dict) or (
                 isinstance(data, (list, tuple)) and not isinstance(data[0], (list, tuple, dict))):
-            self._data.setdefault(table, []).append(data_to_list_or_dict(self, data))
-            self._data_count += 1
+            data = [data_to_list_or_dict(self, data)]
 
         else:  # 二维数组
-            self._data.setdefault(table, []).extend([data_to_list_or_dict(self, d) for d in data])
+            data = [data_to_list_or_dict(self, d) for d in data]
+
+        with self._lock:
+            self._data.setdefault(table, []).extend(data)
             self._data_count += len(data)
 
-        if 0 < self.cache_size <= self._data_count:
-            self.record()
+        self._check_cache()
 
-    def run_sql(self, sql, single=True, commit=False):
+    def run_sql(self, sql, single=True, commit=False, params=None):
         """执行sql语句并返回结果
         :param sql: sql语句
         :param single: 是否只获取一个结果
         :param commit: 是否提交到数据库
+        :param params: sql语句中占位符对应的参数，tuple或dict格式
         :return: 查找到的结果，没有结果时返回None
         """
-        self._cur.execute(sql)
+        self._cur.execute(sql, params or ())
+        if _DDL.match(sql):  # 表结构可能被修改
+            self.refresh_tables()
         r = self._cur.fetchone() if single else self._cur.fetchall()
         if commit:
             self._conn.commit()
         return r
 
+    def iter_sql(self, sql, params=None, size=1000, as_dict=False):
+        """执行查询语句，每次从数据库读取size行，逐行返回结果，不一次读取所有数据
+        缓存中有语句涉及的表的数据时，先写入数据库再查询
+        :param sql: sql语句
+        :param params: sql语句中占位符对应的参数，tuple或dict格式
+        :param size: 每次从数据库读取的行数
+        :param as_dict: 是否以dict格式返回每行数据，键为列名
+        :return: 生成器
+        """
+        if self._pending_in(sql):
+            self.record()
+
+        cur = self._conn.cursor()
+        try:
+            cur.execute(sql, params or ())
+            names = [i[0] for i in cur.description] if as_dict and cur.description else None
+            while True:
+                rows = cur.fetchmany(size)
+                if not rows:
+                    break
+                if names:
+                    for row in rows:
+                        yield dict(zip(names, row))
+                else:
+                    yield from rows
+
+        finally:
+            cur.close()
+
+    def _check_cache(self):
+        """重写父类方法，缓存满自动写入时不建立延迟的索引"""
+        if 0 < self._cache <= self._data_count:
+            if self._use_writer():
+                self.flush(wait=False)
+            else:
+                super().record()
+
+    def _pending_in(self, sql):
+        """返回缓存中是否有sql语句涉及的表的数据
+        :param sql: sql语句
+        :return: bool
+        """
+        with self._lock:
+            tables = [t for t, d in self._data.items() if d]
+        if not tables and not self._batches:
+            return False
+        if self._batches:  # 后台线程正在写入的数据也须写完
+            return True
+        return compile(r'\b(?:' + '|'.join(escape(t) for t in tables) + r')\b', IGNORECASE).search(sql) is not None
+
+    def refresh_tables(self):
+        """清除缓存的表结构，下次写入时重新从数据库读取，在其它程序修改了表结构后使用
+        :return: None
+        """
+        self._tables = None
+        self._indexed.clear()
+        self._index_ready.clear()
+
     def _connect(self):
         """连接数据库"""
         path = Path(self.path).parent
         if not path.exists():
             path.mkdir(parents=True, exist_ok=True)
-        self._conn = connect(self.path)
+        self._conn = connect(self.path, check_same_thread=False)
         self._cur = self._conn.cursor()
+        self.refresh_tables()
+        self._set_pragmas()
+
+    def _set_pragmas(self, cur=None):
+        """在连接上执行PRAGMA设置，page_size须在journal_mode之前设置
+        :param cur: 要设置的游标，为None时设置主连接和后台写入线程的连接
+        :return: None
+        """
+        curs = [cur] if cur else [self._cur] + ([self._writer_conn.cursor()] if self._writer_conn else [])
+        for c in curs:
+            for k in sorted(self._pragmas, key=lambda x: x != 'page_size'):
+                c.execute(f'PRAGMA {k}={self._pragmas[k]}')
+                c.fetchall()
 
     def _close_connection(self):
         """关闭数据库 """
         if self._conn is not None:
             self._cur.close()
             self._conn.close()
+            self._conn = self._cur = None
+
+    def _writer_start(self):
+        """后台写入线程使用自己的连接，其它线程不接触该连接"""
+        self._writer_conn = connect(self.path, check_same_thread=False)
+        self._set_pragmas(self._writer_conn.cursor())
+
+    def _writer_stop(self):
+        """关闭后台写入线程的连接"""
+        if self._writer_conn is not None:
+            self._writer_conn.close()
+            self._writer_conn = None
 
-    def _to_database(self, data_list, table, tables):
-        """把数据批量写入指定数据表
+    def _get_tables(self, cur):
+        """返回数据库中数据表和列名，只在缓存为空时读取数据库
+        :param cur: 使用的游标
+        :return: 格式为{表名: 列名列表}
+        """
+        if self._tables is None:
+            cur.execute("select name from sqlite_master where type='table'")
+            tables = {}
+            for table in cur.fetchall():
+                cur.execute(f"PRAGMA table_info({table[0]})")
+                tables[table[0]] = [i[1] for i in cur.fetchall()]
+            self._tables = tables
+        return self._tables
+
+    def _to_database(self, data_list, table, tables, cur, keys=None):
+        """把数据批量写入指定数据表，dict数据缺少的列填入NULL
         :param data_list: 要写入的数据组成的列表
-        :param table: 要写入数据的数据表名称
+        :param table: 要写入数据的数据表名称，数据中的列须已存在
         :param tables: 数据库中数据表和列信息
+        :param cur: 使用的游标
+        :param keys: 要写入的列，须包含所有dict数据的列名，为None时写入表的所有列
         :return: None
         """
-        if isinstance(data_list[0], dict):  # 检查是否要新增列
-            keys = data_list[0].keys()
-            for key in keys:
-                if key not in tables[table]:
-                    sql = f'ALTER TABLE {table} ADD COLUMN {key}'
-                    self._cur.execute(sql)
-                    tables[table].append(key)
-
-            question_masks = ','.join('?' * len(keys))
-            keys_txt = ','.join(keys)
-            values = [ok_list(i.values()) for i in data_list]
-            sql = f'INSERT INTO {table} ({keys_txt}) values ({question_masks})'
+        cols = tables[table]
+        keys = tuple(cols if keys is None else keys)
+        long = len(cols)
+        values = []
+        for d in data_list:
+            if isinstance(d, dict):
+                values.append(tuple(map(d.get, keys)))
+            elif len(d) < long:
+                values.append(tuple(d) + (None,) * (long - len(d)))
+            elif len(d) > long:
+                raise RuntimeError('数据个数大于列数（注意before和after属性）。')
+            else:
+                values.append(d)
+
+        if not set(map(type, chain.from_iterable(values))) <= _NATIVE:  # 只处理有非原生类型数据的行
+            values = [v if set(map(type, v)) <= _NATIVE else _db_list(v) for v in values]
 
+        if table in self._upsert_keys:
+            self._ensure_unique(table, tables, cur)
+        cur.executemany(self._insert_sql(table, keys), values)
+
+    def _insert_sql(self, table, keys):
+        """返回写入数据的sql语句，按表名、列名和唯一键缓存，使相同的语句文本能命中sqlite3的语句缓存
+        :param table: 数据表名称
+        :param keys: 要写入的列名元组
+        :return: sql语句
+        """
+        unique = self._upsert_keys.get(table)
+        cache_key = (table, keys, unique)
+        sql = self._sql_cache.get(cache_key)
+        if sql is not None:
+            return sql
+
+        keys_txt = ','.join(keys)
+        question_masks = ','.join('?' * len(keys))
+        if not unique:
+            sql = f'INSERT INTO {table} ({keys_txt}) values ({question_masks})'
+        elif sqlite_version_info < (3, 24, 0):  # 旧版本不支持ON CONFLICT，整行替换
+            sql = f'INSERT OR REPLACE INTO {table} ({keys_txt}) values ({question_masks})'
         else:
-            question_masks = ','.join('?' * len(tables[table]))
-            values = data_list
-            sql = f'INSERT INTO {table} values ({question_masks})'
-
-        self._cur.executemany(sql, values)
-
-    def _record(self):
-        """保存数据到sqlite"""
-        # 获取所有表名和列名
-        self._cur.execute("select name from sqlite_master where type='table'")
-        tables = {}
-        for table in self._cur.fetchall():
-            self._cur.execute(f"PRAGMA table_info({table[0]})")
-            tables[table[0]] = [i[1] for i in self._cur.fetchall()]
-
-        for table, data in self._data.items():
-            data_list = []
-            if isinstance(data[0], dict):
-                curr_keys = data[0].keys()
+            updates = ','.join(f'{k}=excluded.{k}' for k in keys if k not in unique)
+            action = f'UPDATE SET {updates}' if updates else 'NOTHING'
+            sql = (f'INSERT INTO {table} ({keys_txt}) values ({question_masks}) '
+                   f'ON CONFLICT ({",".join(unique)}) DO {action}')
+
+        if len(self._sql_cache) >= 256:  # 列名组合过多时避免无限增长
+            self._sql_cache.clear()
+        self._sql_cache[cache_key] = sql
+        return sql
+
+    def _ensure_unique(self, table, tables, cur):
+        """确保已为数据表的唯一键建立唯一索引
+        :param table: 数据表名称
+        :param tables: 数据库中数据表和列信息
+        :param cur: 使用的游标
+        :return: None
+        """
+        if table in self._indexed:
+            return
+
+        unique = self._upsert_keys[table]
+        lost = [k for k in unique if k not in tables[table]]
+        if lost:
+            raise RuntimeError(f'数据表{table}中没有这些唯一键列：{"、".join(lost)}。')
+        cur.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {table}_{"_".join(unique)}_unique '
+                    f'ON {table} ({",".join(unique)})')
+        self._indexed.add(table)
+
+    def _record(self, all_data):
+        """保存数据到sqlite
+        :param all_data: 要写入的数据，格式为{表名: 数据列表}
+        :return: None
+        """
+        # 在后台写入线程中使用该线程的连接
+        conn = self._writer_conn if self._writer is current_thread() and self._writer_conn else self._conn
+        cur = conn.cursor()
+        tables = self._get_tables(cur)
+        try:
+            self._record_tables(all_data, tables, cur)
+        except Exception:  # 未提交的修改回滚，表结构重新读取
+            conn.rollback()
+            self.refresh_tables()
+            raise
+        conn.commit()
+
+    def _create_indexes(self, table, tables, cur):
+        """建立数据表已设置的索引，所需的列未全部存在的索引留待以后建立
+        :param table: 数据表名称
+        :param tables: 数据库中数据表和列信息
+        :param cur: 使用的游标
+        :return: None
+        """
+        done = True
+        for cols in self._indexes.get(table, ()):
+            if any(c not in tables.get(table, ()) for c in cols):
+                done = False
+                continue
+
+            name = _index_name(table, cols)
+            t = perf_counter()
+            cur.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({",".join(cols)})')
+            self._index_times[name] = perf_counter() - t
+            if self.show_msg:
+                print(f'{self.path} 建立索引{name}用时{self._index_times[name]:.2f}秒。')
+
+        if done:
+            self._index_ready.add(table)
+
+    def _record_tables(self, all_data, tables, cur):
+        """把各表数据写入数据库，不提交，每个表只修改一次表结构
+        :param all_data: 要写入的数据，格式为{表名: 数据列表}
+        :param tables: 数据库中数据表和列信息
+        :param cur: 使用的游标
+        :return: None
+        """
+        for table, data in all_data.items():
+            dicts = [d for d in data if isinstance(d, dict)]
+            keys = _union_keys(dicts)
+            schema = self._schemas.get(table, {})
+            if table not in tables:
+                if not isinstance(data[0], dict) and not schema:
+                    raise TypeError('新建表格首次须接收数据需为dict格式。')
+                cols = list(schema) + [k for k in keys if k not in schema]
+                cols_txt = ','.join(_column_def(k, schema.get(k) or _infer_type(d.get(k) for d in dicts))
+                                    for k in cols)
+                cur.execute(f"CREATE TABLE {table} ({cols_txt})")
+                tables[table] = cols
+
             else:
-                curr_keys = len(data[0])
+                for key in keys:
+                    if key not in tables[table]:
+                        col = _column_def(key, schema.get(key) or _infer_type(d.get(key) for d in dicts))
+                        cur.execute(f'ALTER TABLE {table} ADD COLUMN {col}')
+                        tables[table].append(key)
 
-            for d in data:
-                if isinstance(d, dict):
-                    tmp_keys = d.keys()
-                    if table not in tables:
-                        keys = d.keys()
-                        self._cur.execute(f"CREATE TABLE {table} ({','.join(keys)})")
-                        tables[table] = tuple(keys)
+            if table in self._indexes:
+                if not self._defer_index:
+                    if table not in self._index_ready:
+                        self._create_indexes(table, tables, cur)
+                elif table not in self._deferred:  # 批量导入时先删除索引，写入后再建立
+                    for cols in self._indexes[table]:
+                        cur.execute(f'DROP INDEX IF EXISTS {_index_name(table, cols)}')
+                    self._deferred.add(table)
+                    self._index_ready.discard(table)
 
-                else:
-                    if table not in tables:
-                        raise TypeError('新建表格首次须接收数据需为dict格式。')
-                    tmp_keys = len(d)
-                    long = len(tables[table])
-                    if long > tmp_keys:
-                        d = ok_list(d)
-                        d.extend([None] * (long - tmp_keys))
-                    elif long < tmp_keys:
-                        raise RuntimeError('数据个数大于列数（注意before和after属性）。')
-
-                if tmp_keys != curr_keys:
-                    self._to_database(data_list, table, tables)
-                    curr_keys = tmp_keys
-                    data_list = []
-
-                data_list.append(d)
-
-            if data_list:
-                self._to_database(data_list, table, tables)
-
-        self._conn.commit()
+            if table in self._upsert_keys:  # 保证每行只更新自身包含的列，按列名组合分批写入
+                batch = [data[0]]
+                shape = _row_shape(data[0])
+                for d in data[1:]:
+                    if _row_shape(d) != shape:
+                        self._to_database(batch, table, tables, cur, batch[0] if shape else None)
+                        batch = []
+                        shape = _row_shape(d)
+                    batch.append(d)
+                self._to_database(batch, table, tables, cur, batch[0] if shape else None)
+
+            else:  # 有list数据时按表的所有列写入
+                self._to_database(data, table, tables, cur, keys if len(dicts) == len(data) else None)
+
+
+def _union_keys(rows):
+    """返回多个dict的键的并集，保持首次出现的顺序
+    :param rows: dict组成的可迭代对象
+    :return: 以键为key的dict
+    """
+    keys = {}
+    for d in rows:
+        keys.update(dict.fromkeys(d))
+    return keys
+
+
+def _infer_type(values):
+    """根据数据推断列类型，整数和小数同时存在时为REAL，其它类型混合时不指定类型
+    :param values: 该列的值
+    :return: 'INTEGER'、'REAL'、'TEXT'、'BLOB'或''
+    """
+    kind = ''
+    for v in values:
+        if v is None:
+            continue
+        if isinstance(v, (bytes, bytearray, memoryview)):
+            t = 'BLOB'
+        elif isinstance(v, int):
+            t = 'INTEGER'
+        elif isinstance(v, float):
+            t = 'REAL'
+        else:
+            t = 'TEXT'
+
+        if not kind or kind == t:
+            kind = t
+        elif {kind, t} == {'INTEGER', 'REAL'}:
+            kind = 'REAL'
+        else:
+            return ''
+    return kind
+
+
+def _column_def(name, col_type):
+    """返回建表或增加列时的列定义
+    :param name: 列名
+    :param col_type: 列类型，为空时不指定
+    :return: 列定义文本
+    """
+    return f'{name} {col_type}' if col_type else name
+
+
+def _db_list(values):
+    """处理一行要写入数据库的数据，bytes数据保持原样以BLOB保存
+    :param values: 一行的值
+    :return: 处理后的列表
+    """
+    return [v if isinstance(v, (bytes, bytearray, memoryview)) else process_content(v) for v in values]
+
+
+def _index_name(table, cols):
+    """返回按列自动生成的索引名称
+    :param table: 数据表名称
+    :param cols: 列名元组
+    :return: 索引名称
+    """
+    return f'{table}_{"_".join(cols)}_index'
+
+
+def _row_shape(row):
+    """返回行数据的列名组合，不计顺序，list数据返回None
+    :param row: 行数据
+    :return: frozenset或None
+    """
+    return frozenset(row) if isinstance(row, dict) else None
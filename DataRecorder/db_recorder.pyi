@@ -1,15 +1,28 @@
 # -*- coding:utf-8 -*-
 from pathlib import Path
 from sqlite3 import Connection, Cursor
-from typing import Union, Any, Optional
+from typing import Union, Any, Optional, Dict, List, Tuple, Set, Iterable, Iterator
 
 from .base import BaseRecorder
 from .setter import DBSetter
 
 
 class DBRecorder(BaseRecorder):
+    PROFILES: Dict[str, Dict[str, Union[str, int]]] = ...
     _conn: Optional[Connection] = ...
     _cur: Optional[Cursor] = ...
+    _writer_conn: Optional[Connection] = ...
+    _tables: Optional[Dict[str, List[str]]] = ...
+    _pragmas: Dict[str, Union[str, int]] = ...
+    _upsert_keys: Dict[str, Tuple[str, ...]] = ...
+    _indexed: Set[str] = ...
+    _schemas: Dict[str, Dict[str, str]] = ...
+    _indexes: Dict[str, List[Tuple[str, ...]]] = ...
+    _index_ready: Set[str] = ...
+    _defer_index: bool = ...
+    _deferred: Set[str] = ...
+    _index_times: Dict[str, float] = ...
+    _sql_cache: Dict[tuple, str] = ...
     _setter: Optional[DBSetter] = ...
     _data: dict = ...
     data: dict = ...
@@ -22,16 +35,70 @@ class DBRecorder(BaseRecorder):
     @property
     def set(self) -> DBSetter: ...
 
+    @property
+    def index_times(self) -> Dict[str, float]: ...
+
     def __del__(self): ...
 
+    def record(self, new_path: Union[str, Path, None] = None) -> str: ...
+
+    def flush(self, wait: bool = True) -> None: ...
+
+    def build_indexes(self) -> None: ...
+
     def add_data(self, data: Any, table: str = None) -> None: ...
 
-    def run_sql(self, sql: str, single: bool = True, commit: bool = False) -> Optional[list, tuple]: ...
+    def run_sql(self, sql: str, single: bool = True, commit: bool = False,
+                params: Union[tuple, list, dict, None] = None) -> Optional[list, tuple]: ...
+
+    def iter_sql(self, sql: str, params: Union[tuple, list, dict, None] = None, size: int = 1000,
+                 as_dict: bool = False) -> Iterator[Union[tuple, dict]]: ...
+
+    def _check_cache(self) -> None: ...
+
+    def _pending_in(self, sql: str) -> bool: ...
+
+    def refresh_tables(self) -> None: ...
 
     def _connect(self) -> None: ...
 
+    def _set_pragmas(self, cur: Optional[Cursor] = None) -> None: ...
+
     def _close_connection(self) -> None: ...
 
-    def _record(self) -> None: ...
+    def _writer_start(self) -> None: ...
+
+    def _writer_stop(self) -> None: ...
+
+    def _record(self, all_data: dict) -> None: ...
+
+    def _create_indexes(self, table: str, tables: Dict[str, List[str]], cur: Cursor) -> None: ...
+
+    def _record_tables(self, all_data: dict, tables: Dict[str, List[str]], cur: Cursor) -> None: ...
+
+    def _get_tables(self, cur: Cursor) -> Dict[str, List[str]]: ...
+
+    def _to_database(self, data_list: list, table: str, tables: dict, cur: Cursor,
+                     keys: Optional[Iterable[str]] = None) -> None: ...
+
+    def _insert_sql(self, table: str, keys: Tuple[str, ...]) -> str: ...
+
+    def _ensure_unique(self, table: str, tables: Dict[str, List[str]], cur: Cursor) -> None: ...
+
+
+def _union_keys(rows: Iterable[dict]) -> Dict[str, None]: ...
+
+
+def _infer_type(values: Iterable[Any]) -> str: ...
+
+
+def _column_def(name: str, col_type: Optional[str]) -> str: ...
+
+
+def _db_list(values: Iterable[Any]) -> list: ...
+
+
+def _index_name(table: str, cols: Tuple[str, ...]) -> str: ...
+
 
-    def _to_database(self, data_list: list, table: str, tables: dict) -> None: ...
+def _row_shape(row: Union[list, tuple, dict]) -> Optional[frozenset]: ...
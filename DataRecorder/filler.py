@@ -1,12 +1,17 @@
 # -*- coding:utf-8 -*-
 from csv import reader as csv_reader, writer as csv_writer
+from datetime import date, datetime
+from itertools import chain, islice
+from os import stat
 from pathlib import Path
-from time import sleep
+from threading import Lock
 
 from openpyxl import load_workbook, Workbook
+from openpyxl.compat import safe_string
 from openpyxl.utils import get_column_letter
 
 from .base import BaseRecorder
+from .csv_index import CsvIndex
 from .setter import FillerSetter
 from .style.cell_style import CellStyle, NoneStyle
 from .tools import parse_coord, get_usable_coord, process_content, data_to_list_or_dict
@@ -35,6 +40,10 @@ class Filler(BaseRecorder):
         self._sign = None
         self._deny_sign = False
         self.row_num_title = 'row'
+        self._use_csv_index = False  # 是否用行索引文件只读写csv中需要的行
+        self._csv_index = None
+        self._use_keys_cache = False  # 是否缓存keys数据，缓存会在内存中保存整个工作表，默认关闭
+        self._keys_cache = None
         if not data_col:
             data_col = sign_col if sign_col else 1
         self.set.path(path, key_cols, begin_row, sign_col, data_col, sign, deny_sign)
@@ -78,13 +87,7 @@ class Filler(BaseRecorder):
         """返回一个列表，由未执行的行数据组成。每行的格式为第一位为行号，其余为 key 列的值。
         eg.[3, '张三', 20]
         """
-        if not self.path or not Path(self.path).exists():
-            raise FileNotFoundError('未指定文件或文件不存在。')
-
-        if self.type == 'csv':
-            return get_csv_keys(self, False)
-        elif self.type == 'xlsx':
-            return get_xlsx_keys(self, False)
+        return self._get_keys(False)
 
     @property
     def dict_keys(self):
@@ -92,13 +95,66 @@ class Filler(BaseRecorder):
         如第一行数据为空，则用列号为值。如果begin_row为1，用列名作为值。
         eg.{'row': 2, 'name': '张三', 'C': '男'}
         """
+        return self._get_keys(True)
+
+    def _get_keys(self, as_dict):
+        """返回keys或dict_keys，开启缓存且文件未被修改时直接从缓存获取
+        :param as_dict: 是否以dict格式返回数据
+        :return: 关键字组成的列表
+        """
+        if not self.path or not Path(self.path).exists():
+            raise FileNotFoundError('未指定文件或文件不存在。')
+        if self.type not in ('csv', 'xlsx'):
+            return None
+
+        if not self._use_keys_cache:
+            return get_csv_keys(self, as_dict) if self.type == 'csv' else get_xlsx_keys(self, as_dict)
+
+        cache = self._get_keys_cache()
+        if cache is None:
+            cache = self._keys_cache = KeysCache(self)
+        return cache.keys(self, as_dict)
+
+    def _get_keys_cache(self):
+        """返回仍然有效的keys缓存，文件或设置被改变时清除缓存
+        :return: KeysCache对象或None
+        """
+        cache = self._keys_cache
+        if cache is not None and cache.stamp != _get_keys_stamp(self):
+            cache = self._keys_cache = None
+        return cache
+
+    def iter_keys(self, limit=None, start_row=None):
+        """逐行返回未执行的行数据，格式同keys，不一次读取整个文件
+        :param limit: 最多返回多少行，None表示不限
+        :param start_row: 从哪一行开始查找，None或小于begin_row时从begin_row开始
+        :return: 生成器
+        """
+        return self._iter_keys(False, limit, start_row)
+
+    def iter_dict_keys(self, limit=None, start_row=None):
+        """逐行返回未执行的行数据，格式同dict_keys，不一次读取整个文件
+        :param limit: 最多返回多少行，None表示不限
+        :param start_row: 从哪一行开始查找，None或小于begin_row时从begin_row开始
+        :return: 生成器
+        """
+        return self._iter_keys(True, limit, start_row)
+
+    def _iter_keys(self, as_dict, limit, start_row):
+        """返回逐行生成key的生成器
+        :param as_dict: 是否以dict格式返回数据
+        :param limit: 最多返回多少行
+        :param start_row: 从哪一行开始查找
+        :return: 生成器
+        """
         if not self.path or not Path(self.path).exists():
             raise FileNotFoundError('未指定文件或文件不存在。')
 
         if self.type == 'csv':
-            return get_csv_keys(self, True)
+            return iter_csv_keys(self, as_dict, start_row, limit)
         elif self.type == 'xlsx':
-            return get_xlsx_keys(self, True)
+            return iter_xlsx_keys(self, as_dict, start_row, limit)
+        return iter(())
 
     @property
     def set(self):
@@ -129,39 +185,38 @@ class Filler(BaseRecorder):
         :param table: 要写入的数据表，仅支持xlsx格式。为None表示用set.table()方法设置的值，为bool表示活动的表格
         :return: None
         """
-        while self._pause_add:  # 等待其它线程写入结束
-            sleep(.1)
-
         if not isinstance(data, (list, tuple)):
             data = (data,)
 
+        num = 0
         if coord not in ('set_link', 'cover_style', 'replace_style', 'set_img', 'set_width', 'set_height'):
             coord = parse_coord(coord, self.data_col)
             if not data:
                 data = ([],)
-                self._data_count += 1
+                num = 1
             # 一维数组
             elif isinstance(data, dict) or (
                     isinstance(data, (list, tuple)) and not isinstance(data[0], (list, tuple, dict))):
                 data = (data_to_list_or_dict(self, data),)
-                self._data_count += 1
+                num = 1
             else:  # 二维数组
                 data = [data_to_list_or_dict(self, d) for d in data]
-                self._data_count += len(data)
+                num = len(data)
 
-        if self._type != 'xlsx':
-            self._data.append((coord, data))
-
-        else:
+        if self._type == 'xlsx':
             if table is None:
                 table = self._table
             elif isinstance(table, bool):
                 table = None
 
-            self._data.setdefault(table, []).append((coord, data))
+        with self._lock:
+            if self._type != 'xlsx':
+                self._data.append((coord, data))
+            else:
+                self._data.setdefault(table, []).append((coord, data))
+            self._data_count += num
 
-        if 0 < self.cache_size <= self._data_count:
-            self.record()
+        self._check_cache()
 
     def set_link(self, coord, link, content=None):
         """为单元格设置超链接
@@ -212,15 +267,23 @@ class Filler(BaseRecorder):
             col = get_column_letter(col)
         self.add_data((col, width), 'set_width')
 
-    def _record(self):
-        """记录数据"""
+    def _record(self, data):
+        """记录数据
+        :param data: 要写入的数据
+        :return: None
+        """
         if self.type == 'xlsx':
-            self._to_xlsx()
+            self._to_xlsx(data)
         elif self.type == 'csv':
-            self._to_csv()
+            self._to_csv(data)
 
-    def _to_xlsx(self):
-        """填写数据到xlsx文件"""
+    def _to_xlsx(self, all_data):
+        """填写数据到xlsx文件
+        :param all_data: 要写入的数据，格式为{表名: 数据列表}
+        :return: None
+        """
+        cache = self._get_keys_cache()
+        cells = set()  # 缓存对应的工作表中被写入的单元格
         if Path(self.path).exists():
             wb = load_workbook(self.path)
             new = False
@@ -229,7 +292,7 @@ class Filler(BaseRecorder):
             new = True
 
         tables = [i.title for i in wb.worksheets]
-        for table, table_data in self._data.items():
+        for table, table_data in all_data.items():
             if table is None:
                 ws = wb.active
 
@@ -247,6 +310,7 @@ class Filler(BaseRecorder):
 
             max_col = ws.max_column
             empty = ws.max_column == ws.max_row == 1 and ws[1][0].value is None
+            track = cache is not None and ws.title == cache.sheet
 
             for data in table_data:
                 if empty:  # 如果是空文件，最大行数设为0，避免直接添加时出现空行
@@ -259,6 +323,8 @@ class Filler(BaseRecorder):
                     coord = parse_coord(data[1][0], self.data_col)
                     row, col = get_usable_coord(coord, max_row, max_col)
                     cell = ws.cell(row, col)
+                    if track:
+                        cells.add((row, col))
                     has_link = True if cell.hyperlink else Filler
                     cell.hyperlink = None if data[1][1] is None else process_content(data[1][1], True)
                     if data[1][2] is not None:
@@ -270,7 +336,11 @@ class Filler(BaseRecorder):
                         NoneStyle().to_cell(cell, replace=False)
                     continue
 
-                elif data[0] in ('replace_style', 'cover_style'):
+                if track and data[0] in ('replace_style', 'cover_style', 'set_img', 'set_width', 'set_height'):
+                    cache = None  # 设置样式、图片、行高列宽可能改变表格范围，不更新缓存
+                    track = False
+
+                if data[0] in ('replace_style', 'cover_style'):
                     mode = data[0] == 'replace_style'
                     coord = data[1][0]
                     style = NoneStyle() if data[1][1] is None else data[1][1]
@@ -333,55 +403,93 @@ class Filler(BaseRecorder):
                         i = i.values()
                     for key, j in enumerate(i):
                         ws.cell(r, col + key).value = process_content(j, True)
+                        if track:
+                            cells.add((r, col + key))
 
+        if cache is not None:
+            ws = wb[cache.sheet]
+            cells = {k: _xlsx_read_value(ws.cell(*k)) for k in cells}
         wb.save(self.path)
         wb.close()
 
-    def _to_csv(self):
-        """填写数据到xlsx文件"""
-        if not Path(self.path).exists():
-            with open(self.path, 'w', encoding=self.encoding):
-                pass
+        if cache is not None:
+            cache.update_xlsx(ws, cells, _get_keys_stamp(self))
+
+    def _to_csv(self, all_data):
+        """填写数据到csv文件
+        :param all_data: 要写入的数据列表
+        :return: None
+        """
+        cache = self._get_keys_cache()
+        csv_index = self._get_csv_index()
+        if csv_index:  # 只读取需要的行
+            lines = csv_index.lines()
+
+        else:
+            if not Path(self.path).exists():
+                with open(self.path, 'w', encoding=self.encoding):
+                    pass
 
-        with open(self.path, 'r', encoding=self.encoding) as f:
-            reader = csv_reader(f, delimiter=self.delimiter, quotechar=self.quote_char)
-            lines = list(reader)
-            lines_count = len(lines)
+            with open(self.path, 'r', encoding=self.encoding) as f:
+                reader = csv_reader(f, delimiter=self.delimiter, quotechar=self.quote_char)
+                lines = list(reader)
 
-            for i in self._data:
-                if i[0] == 'set_link':
-                    coord = parse_coord(i[1][0], self.data_col)
-                    now_data = (f'=HYPERLINK("{i[1][1]}","{i[1][2] or i[1][1]}")',)
+        lines_count = old_count = len(lines)
+        touched = set()  # 被修改的行号
+        for i in all_data:
+            if i[0] == 'set_link':
+                coord = parse_coord(i[1][0], self.data_col)
+                now_data = (f'=HYPERLINK("{i[1][1]}","{i[1][2] or i[1][1]}")',)
 
-                elif i[0] in ('cover_style', 'replace_style', 'set_img', 'set_width', 'set_height'):
-                    continue
+            elif i[0] in ('cover_style', 'replace_style', 'set_img', 'set_width', 'set_height'):
+                continue
 
-                else:
-                    coord = i[0]
-                    now_data = i[1]
+            else:
+                coord = i[0]
+                now_data = i[1]
 
-                row, col = get_usable_coord(coord, lines_count, len(lines[0]) if lines_count else 1)
-                now_data = (now_data,) if not isinstance(now_data[0], (list, tuple, dict)) else now_data
+            row, col = get_usable_coord(coord, lines_count, len(lines[0]) if lines_count else 1)
+            now_data = (now_data,) if not isinstance(now_data[0], (list, tuple, dict)) else now_data
 
-                for r, data in enumerate(now_data, row):
-                    if isinstance(data, dict):
-                        data = list(data.values())
+            for r, data in enumerate(now_data, row):
+                if isinstance(data, dict):
+                    data = list(data.values())
 
-                    for _ in range(r - lines_count):  # 若行数不够，填充行数
-                        lines.append([])
-                        lines_count += 1
+                for _ in range(r - lines_count):  # 若行数不够，填充行数
+                    lines.append([])
+                    lines_count += 1
 
-                    row_num = r - 1
+                row_num = r - 1
+                touched.add(r)
 
-                    # 若列数不够，填充空列
-                    lines[row_num].extend([None] * (col - len(lines[row_num]) + len(data) - 1))
+                # 若列数不够，填充空列
+                lines[row_num].extend([None] * (col - len(lines[row_num]) + len(data) - 1))
 
-                    for k, j in enumerate(data):  # 填充数据
-                        lines[row_num][col + k - 1] = process_content(j)
+                for k, j in enumerate(data):  # 填充数据
+                    lines[row_num][col + k - 1] = process_content(j)
 
-            writer = csv_writer(open(self.path, 'w', encoding=self.encoding, newline=''), delimiter=self.delimiter,
-                                quotechar=self.quote_char)
-            writer.writerows(lines)
+        if csv_index:
+            lines.commit()
+        else:
+            with open(self.path, 'w', encoding=self.encoding, newline='') as f:
+                writer = csv_writer(f, delimiter=self.delimiter, quotechar=self.quote_char)
+                writer.writerows(lines)
+
+        if cache is not None:
+            touched.update(range(old_count + 1, lines_count + 1))
+            cache.update_csv({r: ['' if v is None else str(v) for v in lines[r - 1]] for r in touched},
+                             _get_keys_stamp(self))
+
+    def _get_csv_index(self):
+        """返回当前文件的行索引对象，未开启或编码不支持时返回None"""
+        if not self._use_csv_index or not CsvIndex.usable(self.encoding):
+            return None
+
+        i = self._csv_index
+        if i is None or (i.path, i.encoding, i.delimiter, i.quote_char) != (
+                self.path, self.encoding, self.delimiter, self.quote_char):
+            self._csv_index = CsvIndex(self.path, self.encoding, self.delimiter, self.quote_char)
+        return self._csv_index
 
 
 def get_xlsx_keys(filler, as_dict):
@@ -392,133 +500,262 @@ def get_xlsx_keys(filler, as_dict):
     :param as_dict: 是否以dict格式返回数据
     :return: 关键字组成的列表或字典
     """
-    wb = load_workbook(filler.path, data_only=True, read_only=True)
-    if filler.table and filler.table not in [i.title for i in wb.worksheets]:
-        raise RuntimeError(f'xlsx文件未包含此工作表：{filler.table}')
-    ws = wb[filler.table] if filler.table else wb.active
+    return list(iter_xlsx_keys(filler, as_dict))
 
-    if ws.max_column is None:  # 遇到过read_only时无法获取列数的文件
-        wb.close()
-        wb = load_workbook(filler.path, data_only=True)
-        ws = wb[filler.table] if filler.table else wb.active
 
-    rows = ws.rows
-    if as_dict:
-        title = [filler.row_num_title]
-        if filler.begin_row == 1:
-            t = [get_column_letter(x) for x in range(1, ws.max_column + 1)
-                 if filler.key_cols is True or x in filler.key_cols]
-        else:
-            try:
-                t = next(rows)
-                t = [x.value if x.value else get_column_letter(k) for k, x in enumerate(t, 1)
-                     if filler.key_cols is True or k in filler.key_cols]
-
-            except StopIteration:
-                return []
+def get_csv_keys(filler, as_dict):
+    """返回key列内容，第一位为行号，其余为key列的值，
+    如果as_dict为True，返回dict格式，value为第一行值，值为空或begin_row为1时用列号，'row'值为行号
+    eg.[3, '名称', 'id']
+    :param filler: 记录器对象
+    :param as_dict: 是否以dict格式返回数据
+    :return: 关键字组成的列表或字典
+    """
+    return list(iter_csv_keys(filler, as_dict))
 
-        if len(t) != len(set(t)):
-            raise RuntimeError('表头出现内容重复。')
-        if filler.row_num_title in t:
-            raise RuntimeError(f'表头"{filler.row_num_title}"列与行号列重复，请用set.row_num_title()方法设置不同的表头。')
-        title.extend(t)
 
+def iter_xlsx_keys(filler, as_dict, start_row=None, limit=None):
+    """逐行生成key列内容，格式同get_xlsx_keys()，以只读模式流式读取
+    :param filler: 记录器对象
+    :param as_dict: 是否以dict格式返回数据
+    :param start_row: 从哪一行开始查找，小于begin_row时以begin_row为准
+    :param limit: 最多返回多少行，None表示不限
+    :return: 生成器
+    """
+    wb = load_workbook(filler.path, data_only=True, read_only=True)
     try:
-        for _ in range(filler.begin_row - 1):
-            next(rows)
-    except StopIteration:
-        return []
-
-    # ---------------------------------------------------------
-
-    if filler.sign_col is True or filler.sign_col > ws.max_column:  # 获取所有行
-        if filler.key_cols is True:  # 获取整行
-            res = [[ind] + [i.value for i in row]
-                   for ind, row in enumerate(rows, filler.begin_row)]
-        else:  # 只获取对应的列
-            res = [[ind] + [row[i - 1].value for i in filler.key_cols]
-                   for ind, row in enumerate(rows, filler.begin_row)]
-
-    else:  # 获取符合条件的行
-        if filler.key_cols is True:  # 获取整行
-            if filler.deny_sign:
-                res = [[ind] + [i.value for i in row]
-                       for ind, row in enumerate(rows, filler.begin_row)
-                       if row[filler.sign_col - 1].value != filler.sign]
-            else:
-                res = [[ind] + [i.value for i in row]
-                       for ind, row in enumerate(rows, filler.begin_row)
-                       if row[filler.sign_col - 1].value == filler.sign]
-
-        else:  # 只获取对应的列
-            if filler.deny_sign:
-                res = [[ind] + [row[i - 1].value for i in filler.key_cols]
-                       for ind, row in enumerate(rows, filler.begin_row)
-                       if row[filler.sign_col - 1].value != filler.sign]
-            else:
-                res = [[ind] + [row[i - 1].value for i in filler.key_cols]
-                       for ind, row in enumerate(rows, filler.begin_row)
-                       if row[filler.sign_col - 1].value == filler.sign]
+        if filler.table and filler.table not in [i.title for i in wb.worksheets]:
+            raise RuntimeError(f'xlsx文件未包含此工作表：{filler.table}')
+        ws = wb[filler.table] if filler.table else wb.active
 
-    wb.close()
+        if ws.max_column is None:  # 遇到过read_only时无法获取列数的文件
+            wb.close()
+            wb = load_workbook(filler.path, data_only=True)
+            ws = wb[filler.table] if filler.table else wb.active
 
-    if as_dict:
-        res = [dict(zip(title, v)) for v in res]
-    return res
+        yield from _iter_key_rows(filler, as_dict, ws.iter_rows(values_only=True), ws.max_column,
+                                  False, start_row, limit)
 
+    finally:
+        wb.close()
 
-def get_csv_keys(filler, as_dict):
-    """返回key列内容，第一位为行号，其余为key列的值，
-    如果as_dict为True，返回dict格式，value为第一行值，值为空或begin_row为1时用列号，'row'值为行号
-    eg.[3, '名称', 'id']
+
+def iter_csv_keys(filler, as_dict, start_row=None, limit=None):
+    """逐行生成key列内容，格式同get_csv_keys()，不一次读取整个文件
     :param filler: 记录器对象
     :param as_dict: 是否以dict格式返回数据
-    :return: 关键字组成的列表或字典
+    :param start_row: 从哪一行开始查找，小于begin_row时以begin_row为准
+    :param limit: 最多返回多少行，None表示不限
+    :return: 生成器
     """
-    begin_row = filler.begin_row
-    sign_col = filler.sign_col
-    sign = '' if filler.sign is None else str(filler.sign)
-    begin_row -= 1
-    res = []
-
     with open(filler.path, 'r', encoding=filler.encoding) as f:
         reader = csv_reader(f, delimiter=filler.delimiter, quotechar=filler.quote_char)
-        lines = list(reader)
-        if not lines:
-            return res
-
-        if as_dict:
-            title = [filler.row_num_title]
-            if filler.begin_row == 1:
-                t = [get_column_letter(x) for x in range(1, len(lines[0]) + 1)
-                     if filler.key_cols is True or x in filler.key_cols]
-            else:
-                t = [x if x else get_column_letter(k) for k, x in enumerate(lines[0], 1)
-                     if filler.key_cols is True or k in filler.key_cols]
-
-            if len(t) != len(set(t)):
-                raise RuntimeError('表头内容重复。')
-            if filler.row_num_title in t:
-                raise RuntimeError(f'表头"{filler.row_num_title}"列与行号列重复，请用set.row_num_title()方法设置不同的表头。')
-            title.extend(t)
-
-        if sign_col is not True:  # 获取符合条件的行
-            sign_col -= 1
-            for ind, line in enumerate(lines[begin_row:], begin_row + 1):
-                row_sign = '' if sign_col > len(line) - 1 else line[sign_col]
-                if row_sign != sign if filler.deny_sign else row_sign == sign:
-                    if filler.key_cols is True:  # 获取整行
-                        res.append([ind] + line)
-                    else:  # 只获取对应的列
-                        res.append([ind] + [line[i - 1] for i in filler.key_cols])
-
-        else:  # 获取所有行
-            for ind, line in enumerate(lines[begin_row:], begin_row + 1):
-                if filler.key_cols is True:  # 获取整行
-                    res.append([ind] + line)
-                else:  # 只获取对应的列
-                    res.append([ind] + [line[i - 1] for i in filler.key_cols])
-
-    if as_dict:
-        res = [dict(zip(title, v)) for v in res]
-    return res
+        yield from _iter_key_rows(filler, as_dict, reader, None, True, start_row, limit)
+
+
+def _iter_key_rows(filler, as_dict, rows, max_col, is_csv, start_row=None, limit=None):
+    """从逐行数据中筛选并生成key列内容
+    :param filler: 记录器对象
+    :param as_dict: 是否以dict格式返回数据
+    :param rows: 从第一行开始的行数据
+    :param max_col: 最大列数，csv文件以第一行长度为准
+    :param is_csv: 是否csv文件的数据，csv文件中的值都是字符串
+    :param start_row: 从哪一行开始查找，小于begin_row时以begin_row为准
+    :param limit: 最多返回多少行，None表示不限
+    :return: 生成器
+    """
+    if limit is not None and limit <= 0:
+        return
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+
+    if is_csv:
+        max_col = len(first)
+        sign = '' if filler.sign is None else str(filler.sign)
+        all_rows = filler.sign_col is True
+        empty = ''
+    else:
+        sign = filler.sign
+        all_rows = filler.sign_col is True or filler.sign_col > max_col
+        empty = None
+
+    title = _get_keys_title(filler, first, max_col) if as_dict else None
+    begin_row = max(filler.begin_row, start_row or 0)
+    rows = islice(chain((first,), rows), begin_row - 1, None)
+    for ind, row in enumerate(rows, begin_row):
+        res = _filter_key_row(filler, ind, row, title, all_rows, sign, empty)
+        if res is None:
+            continue
+        yield res
+        if limit is not None:
+            limit -= 1
+            if not limit:
+                return
+
+
+def _get_keys_title(filler, first_row, max_col):
+    """获取dict格式key的键名
+    :param filler: 记录器对象
+    :param first_row: 第一行的值
+    :param max_col: 最大列数
+    :return: 键名列表
+    """
+    title = [filler.row_num_title]
+    if filler.begin_row == 1:
+        t = [get_column_letter(x) for x in range(1, max_col + 1)
+             if filler.key_cols is True or x in filler.key_cols]
+    else:
+        t = [x if x else get_column_letter(k) for k, x in enumerate(first_row, 1)
+             if filler.key_cols is True or k in filler.key_cols]
+
+    if len(t) != len(set(t)):
+        raise RuntimeError('表头内容重复。')
+    if filler.row_num_title in t:
+        raise RuntimeError(f'表头"{filler.row_num_title}"列与行号列重复，请用set.row_num_title()方法设置不同的表头。')
+    title.extend(t)
+    return title
+
+
+def _filter_key_row(filler, ind, row, title, all_rows, sign, empty=None):
+    """按sign_col和sign筛选一行，符合条件时返回该行key列数据
+    :param filler: 记录器对象
+    :param ind: 行号
+    :param row: 行数据
+    :param title: dict格式的键名，为None时返回list
+    :param all_rows: 是否不作筛选
+    :param sign: 筛选值
+    :param empty: sign_col超出行长度时该列的值
+    :return: 符合条件时返回list或dict，否则返回None
+    """
+    if not all_rows:
+        row_sign = empty if filler.sign_col > len(row) else row[filler.sign_col - 1]
+        if (row_sign == sign) == filler.deny_sign:
+            return None
+
+    if filler.key_cols is True:  # 获取整行
+        res = [ind] + list(row)
+    else:  # 只获取对应的列
+        res = [ind] + [row[i - 1] for i in filler.key_cols]
+
+    return dict(zip(title, res)) if title else res
+
+
+class KeysCache(object):
+    def __init__(self, filler):
+        """缓存用于获取keys的文件数据，文件未被外部修改时不重复读取，Filler写入数据后直接更新缓存
+        :param filler: Filler对象
+        """
+        self.stamp = _get_keys_stamp(filler)
+        self.sheet = None  # 缓存的xlsx工作表名称，csv文件为None
+        self._lock = Lock()  # 防止读取结果时缓存被写入线程修改
+        self._results = {}  # 按筛选设置缓存的结果
+
+        if filler.type == 'csv':
+            self._max_col = None
+            with open(filler.path, 'r', encoding=filler.encoding) as f:
+                self._rows = list(csv_reader(f, delimiter=filler.delimiter, quotechar=filler.quote_char))
+            return
+
+        wb = load_workbook(filler.path, data_only=True, read_only=True)
+        try:
+            if filler.table and filler.table not in [i.title for i in wb.worksheets]:
+                raise RuntimeError(f'xlsx文件未包含此工作表：{filler.table}')
+            ws = wb[filler.table] if filler.table else wb.active
+
+            if ws.max_column is None:  # 遇到过read_only时无法获取列数的文件
+                wb.close()
+                wb = load_workbook(filler.path, data_only=True)
+                ws = wb[filler.table] if filler.table else wb.active
+
+            self.sheet = ws.title
+            self._max_col = ws.max_column
+            self._rows = [list(i) for i in ws.iter_rows(values_only=True)]
+
+        finally:
+            wb.close()
+
+    def keys(self, filler, as_dict):
+        """按当前筛选设置返回keys，结果会被缓存
+        :param filler: Filler对象
+        :param as_dict: 是否以dict格式返回数据
+        :return: 关键字组成的列表
+        """
+        key_cols = filler.key_cols if filler.key_cols is True else tuple(filler.key_cols)
+        settings = (as_dict, key_cols, filler.begin_row, filler.sign_col, filler.sign, filler.deny_sign,
+                    filler.row_num_title)
+        with self._lock:
+            res = self._results.get(settings)
+            if res is None:
+                res = list(_iter_key_rows(filler, as_dict, self._rows, self._max_col, self.sheet is None))
+                self._results[settings] = res
+            return list(res)
+
+    def update_csv(self, rows, stamp):
+        """用写入csv文件的数据更新缓存
+        :param rows: 被修改的行，格式为{行号: 行数据}
+        :param stamp: 写入后的文件状态
+        :return: None
+        """
+        with self._lock:
+            for r, row in rows.items():
+                self._rows.extend([] for _ in range(r - len(self._rows)))
+                self._rows[r - 1] = row
+            self._results.clear()
+            self.stamp = stamp
+
+    def update_xlsx(self, ws, cells, stamp):
+        """用写入xlsx文件的数据更新缓存
+        :param ws: 写入数据后的工作表对象
+        :param cells: 被修改的单元格，格式为{(行号, 列号): 值}
+        :param stamp: 写入后的文件状态
+        :return: None
+        """
+        with self._lock:
+            max_row, max_col = ws.max_row, ws.max_column
+            rows = self._rows
+            if max_col != self._max_col:
+                for k, row in enumerate(rows):
+                    rows[k] = row[:max_col] + [None] * (max_col - len(row))
+                self._max_col = max_col
+            del rows[max_row:]
+            rows.extend([None] * max_col for _ in range(max_row - len(rows)))
+
+            for cell in ws._cells.values():  # 保存后公式的计算结果会丢失，重新读取时为None
+                if cell.data_type == 'f':
+                    rows[cell.row - 1][cell.column - 1] = None
+            for (r, c), value in cells.items():
+                rows[r - 1][c - 1] = value
+
+            self._results.clear()
+            self.stamp = stamp
+
+
+def _get_keys_stamp(filler):
+    """返回决定keys缓存是否有效的文件状态和设置
+    :param filler: Filler对象
+    :return: tuple格式，文件不存在时返回None
+    """
+    try:
+        s = stat(filler.path)
+    except OSError:
+        return None
+    return (filler.path, filler.type, filler.table, filler.encoding, filler.delimiter, filler.quote_char,
+            s.st_size, s.st_mtime_ns)
+
+
+def _xlsx_read_value(cell):
+    """返回单元格的值保存后以data_only模式读取时的结果
+    :param cell: 单元格对象
+    :return: 读取时的值
+    """
+    value = cell.value
+    if cell.data_type == 'f' or value == '':
+        return None
+    if isinstance(value, date) and not isinstance(value, datetime):  # 日期读取时为datetime
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = safe_string(value)
+        return float(value) if '.' in value or 'e' in value.lower() else int(value)
+    return value
@@ -1,8 +1,13 @@
 # -*- coding:utf-8 -*-
 from pathlib import Path
-from typing import Union, List, Any, Tuple, Optional
+from threading import Lock
+from typing import Union, List, Any, Tuple, Optional, Iterator, Dict, Iterable
+
+from openpyxl.cell import Cell
+from openpyxl.worksheet.worksheet import Worksheet
 
 from .base import BaseRecorder
+from .csv_index import CsvIndex
 from .style import CellStyle
 from .setter import FillerSetter
 
@@ -21,6 +26,10 @@ class Filler(BaseRecorder):
     _data: Union[list, dict] = ...
     data: Union[list, dict] = ...
     row_num_title: str = ...
+    _use_csv_index: bool = ...
+    _csv_index: Optional[CsvIndex] = ...
+    _use_keys_cache: bool = ...
+    _keys_cache: Optional[KeysCache] = ...
 
     def __init__(self, path: Optional[str, Path] = None,
                  cache_size: int = None,
@@ -55,6 +64,17 @@ class Filler(BaseRecorder):
     @property
     def dict_keys(self) -> List[dict]: ...
 
+    def _get_keys(self, as_dict: bool) -> Optional[list]: ...
+
+    def _get_keys_cache(self) -> Optional[KeysCache]: ...
+
+    def iter_keys(self, limit: Optional[int] = None, start_row: Optional[int] = None) -> Iterator[list]: ...
+
+    def iter_dict_keys(self, limit: Optional[int] = None, start_row: Optional[int] = None) -> Iterator[dict]: ...
+
+    def _iter_keys(self, as_dict: bool, limit: Optional[int],
+                   start_row: Optional[int]) -> Iterator[Union[list, dict]]: ...
+
     @property
     def set(self) -> FillerSetter: ...
 
@@ -83,14 +103,59 @@ class Filler(BaseRecorder):
 
     def set_col_width(self, col: Union[int, str], width: float) -> None: ...
 
-    def _record(self) -> None: ...
+    def _record(self, data: Union[list, dict]) -> None: ...
+
+    def _to_xlsx(self, all_data: dict) -> None: ...
 
-    def _to_xlsx(self) -> None: ...
+    def _to_csv(self, all_data: list) -> None: ...
 
-    def _to_csv(self) -> None: ...
+    def _get_csv_index(self) -> Optional[CsvIndex]: ...
 
 
 def get_xlsx_keys(filler: Filler, as_dict: bool) -> List[Union[list, dict]]: ...
 
 
 def get_csv_keys(filler: Filler, as_dict: bool) -> List[Union[list, dict]]: ...
+
+
+def iter_xlsx_keys(filler: Filler, as_dict: bool, start_row: Optional[int] = None,
+                   limit: Optional[int] = None) -> Iterator[Union[list, dict]]: ...
+
+
+def iter_csv_keys(filler: Filler, as_dict: bool, start_row: Optional[int] = None,
+                  limit: Optional[int] = None) -> Iterator[Union[list, dict]]: ...
+
+
+def _get_keys_title(filler: Filler, first_row: Union[list, tuple], max_col: int) -> list: ...
+
+
+def _filter_key_row(filler: Filler, ind: int, row: Union[list, tuple], title: Optional[list], all_rows: bool,
+                    sign: Any, empty: Any = None) -> Optional[list, dict]: ...
+
+
+def _iter_key_rows(filler: Filler, as_dict: bool, rows: Iterable[Union[list, tuple]], max_col: Optional[int],
+                   is_csv: bool, start_row: Optional[int] = None,
+                   limit: Optional[int] = None) -> Iterator[Union[list, dict]]: ...
+
+
+class KeysCache(object):
+    stamp: Optional[tuple] = ...
+    sheet: Optional[str] = ...
+    _lock: Lock = ...
+    _results: Dict[tuple, list] = ...
+    _max_col: Optional[int] = ...
+    _rows: List[list] = ...
+
+    def __init__(self, filler: Filler): ...
+
+    def keys(self, filler: Filler, as_dict: bool) -> list: ...
+
+    def update_csv(self, rows: Dict[int, list], stamp: Optional[tuple]) -> None: ...
+
+    def update_xlsx(self, ws: Worksheet, cells: Dict[Tuple[int, int], Any], stamp: Optional[tuple]) -> None: ...
+
+
+def _get_keys_stamp(filler: Filler) -> Optional[tuple]: ...
+
+
+def _xlsx_read_value(cell: Cell) -> Any: ...
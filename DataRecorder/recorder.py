@@ -1,18 +1,20 @@
 # -*- coding:utf-8 -*-
+from copy import copy
 from pathlib import Path
-from time import sleep
 from typing import Union
 
 from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
 
 from .base import BaseRecorder
 from .style.cell_style import CellStyleCopier
 from .setter import RecorderSetter
 from .tools import ok_list, data_to_list_or_dict, process_content
+from .xlsx_appender import append_xlsx_rows, get_xlsx_sheets, get_xlsx_head
 
 
 class Recorder(BaseRecorder):
-    SUPPORTS = ('csv', 'xlsx', 'json', 'txt')
+    SUPPORTS = ('csv', 'xlsx', 'json', 'jsonl', 'ndjson', 'txt')
 
     def __init__(self, path=None, cache_size=None):
         """用于缓存并记录数据，可在达到一定数量时自动记录，以降低文件读写次数，减少开销
@@ -26,6 +28,28 @@ class Recorder(BaseRecorder):
         self._col_height = None
         self._style = None
         self._fit_head = False
+        self._session = False  # 是否在多次写入之间保持xlsx工作簿打开
+        self._wb = None  # 会话中保持打开的工作簿
+        self._wb_path = None  # 打开的工作簿对应的文件路径
+        self._xlsx_engine = 'openpyxl'  # 追加数据到已有xlsx文件的方式
+
+    def __enter__(self):
+        """进入上下文时开启会话，xlsx工作簿在多次写入之间保持打开，只在checkpoint()或退出时保存"""
+        self._session = True
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """退出上下文时写入剩余数据并保存工作簿"""
+        try:
+            self.record()
+        finally:
+            self._session = False
+            self._save_wb(close=True)
+
+    def __del__(self):
+        """重写父类方法，保存会话中未保存的工作簿"""
+        super().__del__()
+        self._save_wb(close=True)
 
     @property
     def set(self):
@@ -50,67 +74,116 @@ class Recorder(BaseRecorder):
         :param table: 要写入的数据表，仅支持xlsx格式。为None表示用set.table()方法设置的值，为bool表示活动的表格
         :return: None
         """
-        while self._pause_add:  # 等待其它线程写入结束
-            sleep(.1)
-
         if not isinstance(data, (list, tuple, dict)):
             data = (data,)
 
         if not data:
             data = ([],)
-            self._data_count += 1
 
         # 一维数组
         elif isinstance(data, dict) or (
                 isinstance(data, (list, tuple)) and not isinstance(data[0], (list, tuple, dict))):
             data = [data_to_list_or_dict(self, data)]
-            self._data_count += 1
 
         else:  # 二维数组
             data = [data_to_list_or_dict(self, d) for d in data]
-            self._data_count += len(data)
-
-        if self._type != 'xlsx':
-            self._data.extend(data)
 
-        else:
+        if self._type == 'xlsx':
             if table is None:
                 table = self._table
             elif isinstance(table, bool):
                 table = None
 
-            self._data.setdefault(table, []).extend(data)
+        with self._lock:
+            if self._type != 'xlsx':
+                self._data.extend(data)
+            else:
+                self._data.setdefault(table, []).extend(data)
+            self._data_count += len(data)
 
-        if 0 < self.cache_size <= self._data_count:
-            self.record()
+        self._check_cache()
 
-    def _record(self):
-        """记录数据"""
+    def record(self, new_path=None):
+        """记录数据，可保存到新文件
+        :param new_path: 文件另存为的路径，会保存新文件
+        :return: 文件路径
+        """
+        if new_path:  # 另存前先保存会话中的工作簿，使复制的文件包含已写入的数据
+            self._save_wb()
+        return super().record(new_path)
+
+    def checkpoint(self):
+        """会话中写入缓存数据并保存工作簿到文件，不在会话中时等同record()
+        :return: 文件路径
+        """
+        path = self.record()
+        self._save_wb()
+        return path
+
+    def _save_wb(self, close=False):
+        """保存会话中打开的工作簿
+        :param close: 保存后是否关闭工作簿
+        :return: None
+        """
+        self._begin_write()
+        try:
+            if self._wb is not None:
+                self._wb.save(self._wb_path)
+                if close:
+                    self._wb.close()
+                    self._wb = self._wb_path = None
+        finally:
+            self._end_write()
+
+    def _record(self, data):
+        """记录数据
+        :param data: 要写入的数据
+        :return: None
+        """
         if self.type == 'csv':
-            self._to_csv()
+            self._to_csv(data)
         elif self.type == 'xlsx':
-            self._to_xlsx()
+            self._to_xlsx(data)
         elif self.type == 'json':
-            self._to_json()
+            self._to_json(data)
+        elif self.type in ('jsonl', 'ndjson'):
+            self._to_jsonl(data)
         elif self.type == 'txt':
-            self._to_txt()
+            self._to_txt(data)
 
-    def _to_xlsx(self):
-        """记录数据到xlsx文件"""
-        if Path(self.path).exists():
+    def _to_xlsx(self, all_data):
+        """记录数据到xlsx文件
+        :param all_data: 要写入的数据，格式为{表名: 数据列表}
+        :return: None
+        """
+        if self._wb is not None and self._wb_path != self.path:  # 路径已改变，保存原来的工作簿
+            self._wb.save(self._wb_path)
+            self._wb.close()
+            self._wb = self._wb_path = None
+
+        if (self._xlsx_engine == 'stream' and self._wb is None and Path(self.path).exists()
+                and not (self._col_height or self._follow_styles or self._style) and self._to_xlsx_stream(all_data)):
+            return
+
+        if self._wb is not None:  # 会话中沿用已打开的工作簿
+            new_file = False
+            wb = self._wb
+
+        elif Path(self.path).exists():
             new_file = False
             wb = load_workbook(self.path)
 
+        elif not self._session:  # 新文件用只写模式一次写入
+            self._to_new_xlsx(all_data)
+            return
+
         else:
             new_file = True
-            if self._col_height or self._follow_styles or self._style or len(self._data) > 1:
-                wb = Workbook(write_only=False)
-            else:
-                wb = Workbook(write_only=True)
-                wb.create_sheet('Sheet1')
+            wb = Workbook()
+            wb.active.title = 'Sheet1'  # 与_to_new_xlsx()新建的工作表同名
 
         tables = [i.title for i in wb.worksheets]
-        for table, data in self._data.items():
+        for table, data in all_data.items():
             _row_styles = None
             _col_height = None
             new_sheet = False
@@ -166,11 +239,85 @@ class Recorder(BaseRecorder):
                     ws.append(ok_list(i, True))
                     _set_style(_col_height, _row_styles, ws, self)
 
+        if self._session:
+            self._wb = wb
+            self._wb_path = self.path
+        else:
+            wb.save(self.path)
+            wb.close()
+
+    def _to_new_xlsx(self, all_data):
+        """以只写模式创建xlsx文件，样式注册为一个命名样式供所有单元格共用，内存占用不随行数增长
+        :param all_data: 要写入的数据，格式为{表名: 数据列表}
+        :return: None
+        """
+        wb = Workbook(write_only=True)
+        named_style = None
+        if self._style:
+            named_style = self._style.to_named_style('DataRecorder')
+            wb.add_named_style(named_style)
+
+        for table, data in all_data.items():
+            ws = wb.create_sheet(table or 'Sheet1')
+            style = None
+            if named_style:  # 每个单元格复制同一个样式索引，不再逐格设置样式
+                cell = WriteOnlyCell(ws)
+                cell.style = named_style.name
+                style = cell._style
+
+            title = _get_title(data[0], self._before, self._after)
+            if title is not None:
+                ws.append(ok_list(title, True))
+
+            head = None
+            if self._fit_head:
+                if not self._head.get(ws.title, None) and title and any(title):
+                    self._head[ws.title] = title
+                head = self._head.get(ws.title, None)
+
+            for i in data:
+                if head and isinstance(i, dict):
+                    i = [i.get(h, None) for h in head]
+                i = ok_list(i, True)
+                if style:
+                    i = [_styled_cell(ws, v, style) for v in i]
+                ws.append(i)
+
         wb.save(self.path)
         wb.close()
 
-    def _to_csv(self):
-        """记录数据到csv文件"""
+    def _to_xlsx_stream(self, all_data):
+        """直接修改工作表xml追加数据，不加载整个工作簿。只支持已存在的工作表，不支持样式
+        :param all_data: 要写入的数据，格式为{表名: 数据列表}
+        :return: 是否写入成功，不支持时返回False，由_to_xlsx()用openpyxl写入
+        """
+        sheets, active = get_xlsx_sheets(self.path)
+        names = [i[0] for i in sheets]
+        if any(table is not None and table not in names for table in all_data):
+            return False
+
+        rows = {}
+        for table, data in all_data.items():
+            title = names[active] if table is None else table
+            if self._fit_head and not self._head.get(title, None):
+                head = get_xlsx_head(self.path, title)
+                if any(head):
+                    self._head[title] = list(head)
+
+            head = self._head.get(title, None) if self._fit_head else None
+            table_rows = rows.setdefault(title, [])
+            for i in data:
+                if head and isinstance(i, dict):
+                    i = [i.get(h, None) for h in head]
+                table_rows.append(ok_list(i, True))
+
+        return append_xlsx_rows(self.path, rows)
+
+    def _to_csv(self, data):
+        """记录数据到csv文件
+        :param data: 要写入的数据列表
+        :return: None
+        """
         if Path(self.path).exists():
             title = None
             if self._fit_head and not self._head:
@@ -183,7 +330,7 @@ class Recorder(BaseRecorder):
                         pass
 
         else:
-            title = _get_title(self._data[0], self._before, self._after)
+            title = _get_title(data[0], self._before, self._after)
             if self._fit_head:
                 self._head = title
 
@@ -194,7 +341,7 @@ class Recorder(BaseRecorder):
                 csv_write.writerow(ok_list(title))
 
             if self._fit_head and self._head:
-                for i in self._data:
+                for i in data:
                     d = data_to_list_or_dict(self, i)
                     if isinstance(d, dict):
                         d = [d.get(h, None) for h in self._head]
@@ -202,41 +349,91 @@ class Recorder(BaseRecorder):
                     csv_write.writerow(ok_list(d))
 
             else:
-                for i in self._data:
+                for i in data:
                     csv_write.writerow(ok_list(i))
 
-    def _to_txt(self):
-        """记录数据到txt文件"""
+    def _to_txt(self, data):
+        """记录数据到txt文件
+        :param data: 要写入的数据列表
+        :return: None
+        """
         with open(self.path, 'a+', encoding=self.encoding) as f:
-            all_data = [' '.join(ok_list(i, as_str=True)) for i in self._data]
+            all_data = [' '.join(ok_list(i, as_str=True)) for i in data]
             f.write('\n'.join(all_data) + '\n')
 
-    def _to_json(self):
-        """记录数据到json文件"""
-        from json import load, dump
-        if Path(self.path).exists():
-            with open(self.path, 'r', encoding=self.encoding) as f:
-                json_data = load(f)
+    def _to_json(self, data):
+        """记录数据到json文件，文件为顶层数组时直接在末尾追加，不解析原有数据
+        :param data: 要写入的数据列表
+        :return: None
+        """
+        from json import load, dump, dumps
+        json_data = []
+        for i in data:
+            if isinstance(i, dict):
+                for d in i:
+                    i[d] = process_content(i[d])
+                json_data.append(i)
+            else:
+                json_data.append([process_content(d) for d in i])
 
-            for i in self._data:
-                if isinstance(i, dict):
-                    for d in i:
-                        i[d] = process_content(i[d])
-                    json_data.append(i)
-                else:
-                    json_data.append([process_content(d) for d in i])
+        path = Path(self.path)
+        if not path.exists() or not path.stat().st_size:
+            with open(self.path, 'w', encoding=self.encoding) as f:
+                dump(json_data, f)
+            return
 
-        else:
-            for i in self._data:
-                if isinstance(i, dict):
-                    for d in i:
-                        i[d] = process_content(i[d])
-                    json_data = i
-                else:
-                    json_data = [process_content(d) for d in i]
+        if _append_json_array(self.path, ', '.join(dumps(i) for i in json_data), self.encoding):
+            return
+
+        # 不是顶层数组，读取全部数据后重写
+        with open(self.path, 'r', encoding=self.encoding) as f:
+            old_data = load(f)
+        if not isinstance(old_data, list):
+            old_data = [old_data]
+        old_data.extend(json_data)
 
         with open(self.path, 'w', encoding=self.encoding) as f:
-            dump(json_data, f)
+            dump(old_data, f)
+
+    def _to_jsonl(self, data):
+        """记录数据到jsonl文件，每条数据一行，只追加不读取原有数据
+        :param data: 要写入的数据列表
+        :return: None
+        """
+        from json import dumps, loads
+        if self._fit_head and not self._head and Path(self.path).exists():
+            with open(self.path, 'r', encoding=self.encoding) as f:
+                line = f.readline()
+            if line.strip():
+                first = loads(line)
+                if isinstance(first, dict):
+                    self._head = list(first)
+
+        lines = []
+        for i in data:
+            if isinstance(i, dict):
+                if self._fit_head:
+                    if not self._head:
+                        self._head = list(i)
+                    i = {h: i.get(h, None) for h in self._head}
+                lines.append(dumps({k: process_content(v) for k, v in i.items()}))
+            else:
+                lines.append(dumps([process_content(d) for d in i]))
+
+        with open(self.path, 'a', encoding=self.encoding) as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+def _styled_cell(ws, value, style):
+    """生成只写模式使用的单元格
+    :param ws: 只写模式的工作表
+    :param value: 单元格的值
+    :param style: 命名样式对应的StyleArray对象
+    :return: WriteOnlyCell对象
+    """
+    cell = WriteOnlyCell(ws, value)
+    cell._style = copy(style)
+    return cell
 
 
 def _set_style(_col_height, _row_styles, ws, recorder):
@@ -253,6 +450,49 @@ def _set_style(_col_height, _row_styles, ws, recorder):
             recorder._style.to_cell(c)
 
 
+def _append_json_array(path, content, encoding):
+    """把已序列化的元素追加到json文件的顶层数组末尾，只读取文件首尾
+    :param path: 文件路径
+    :param content: 已序列化的元素，用逗号连接
+    :param encoding: 文件编码
+    :return: 是否追加成功，文件不是顶层数组或编码不兼容ascii时返回False
+    """
+    if ' [],\t\r\n'.encode(encoding) != b' [],\t\r\n':
+        return False
+
+    with open(path, 'rb+') as f:
+        if f.read(4096).lstrip()[:1] != b'[':
+            return False
+
+        end, char = _last_char(f, f.seek(0, 2))
+        if char != b']':
+            return False
+
+        _, char = _last_char(f, end)
+        f.seek(end)
+        f.write((b'' if char == b'[' else b', ') + content.encode(encoding) + b']')
+        f.truncate()
+
+    return True
+
+
+def _last_char(f, end):
+    """从end位置往前查找最后一个非空白字符
+    :param f: 以二进制模式打开的文件对象
+    :param end: 开始往前查找的位置
+    :return: 字符的位置和字符，找不到时返回(-1, b'')
+    """
+    while end > 0:
+        start = max(0, end - 4096)
+        f.seek(start)
+        chunk = f.read(end - start).rstrip()
+        if chunk:
+            return start + len(chunk) - 1, chunk[-1:]
+        end = start
+
+    return -1, b''
+
+
 def _get_title(data: Union[list, dict],
                before: Union[list, dict, None] = None,
                after: Union[list, dict, None] = None) -> Union[list, None]:
@@ -1,6 +1,9 @@
 # -*- coding:utf-8 -*-
+from pathlib import Path
 from typing import Any, Optional, Union
 
+from openpyxl.workbook import Workbook
+
 from .base import BaseRecorder
 from .style.cell_style import CellStyle
 from .setter import RecorderSetter
@@ -17,6 +20,16 @@ class Recorder(BaseRecorder):
     data: Union[list, dict] = ...
     _head: Optional[list, dict] = ...
     _fit_head: bool = ...
+    _session: bool = ...
+    _wb: Optional[Workbook] = ...
+    _wb_path: Optional[str] = ...
+    _xlsx_engine: str = ...
+
+    def __enter__(self) -> Recorder: ...
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None: ...
+
+    def __del__(self) -> None: ...
 
     @property
     def set(self) -> RecorderSetter: ...
@@ -29,12 +42,24 @@ class Recorder(BaseRecorder):
 
     def add_data(self, data: Any, table: Union[str, bool] = None) -> None: ...
 
-    def _record(self) -> None: ...
+    def record(self, new_path: Optional[str, Path] = None) -> str: ...
+
+    def checkpoint(self) -> str: ...
+
+    def _save_wb(self, close: bool = False) -> None: ...
+
+    def _record(self, data: Union[list, dict]) -> None: ...
+
+    def _to_xlsx(self, all_data: dict) -> None: ...
+
+    def _to_new_xlsx(self, all_data: dict) -> None: ...
+
+    def _to_xlsx_stream(self, all_data: dict) -> bool: ...
 
-    def _to_xlsx(self) -> None: ...
+    def _to_csv(self, data: list) -> None: ...
 
-    def _to_csv(self) -> None: ...
+    def _to_txt(self, data: list) -> None: ...
 
-    def _to_txt(self) -> None: ...
+    def _to_json(self, data: list) -> None: ...
 
-    def _to_json(self) -> None: ...
+    def _to_jsonl(self, data: list) -> None: ...
@@ -28,6 +28,7 @@ class OriginalSetter(object):
         """
         if self._recorder._path:
             self._recorder.record()
+        self._recorder._stop_writer()  # 后台线程使用的资源属于原文件，在需要时重新启动
 
         self._recorder._path = str(path)
         self._recorder._data = []
@@ -39,6 +40,25 @@ class OriginalSetter(object):
         """
         self._recorder.show_msg = on_off
 
+    def async_write(self, on_off=True, queue_size=None):
+        """设置是否由后台线程写入文件，开启后缓存满时add_data()不等待写入完成
+        :param on_off: bool表示开关
+        :param queue_size: 最多有多少批数据等待写入，超过时add_data()等待后台线程，0为不限，None为不修改
+        :return: None
+        """
+        if queue_size is not None:
+            if not isinstance(queue_size, int) or queue_size < 0:
+                raise ValueError('queue_size须为不小于0的int。')
+            self._recorder._queue_size = queue_size
+        if not on_off and self._recorder._async:
+            self._recorder._async = False
+            self._recorder._stop_writer()
+            self._recorder._wait_writer()
+        elif on_off:
+            from .base import _async_recorders
+            _async_recorders.add(self._recorder)
+        self._recorder._async = on_off
+
 
 class BaseSetter(OriginalSetter):
     def table(self, name):
@@ -249,6 +269,26 @@ class FillerSetter(SheetLikeSetter):
         """
         self._recorder._link_style = style
 
+    def csv_index(self, on_off=True):
+        """设置是否为csv文件建立行索引（保存在同名.idx文件），开启后填写数据时只读取涉及的行，
+        修改后字节数不变的行原地覆盖，字节数改变时其后直到文件末尾的内容都要移动，新增行直接追加
+        :param on_off: bool表示开关
+        :return: None
+        """
+        self._recorder._use_csv_index = on_off
+        if not on_off:
+            self._recorder._csv_index = None
+
+    def keys_cache(self, on_off=True):
+        """设置是否缓存keys和dict_keys的数据，开启后文件未被外部修改时不重复读取文件，默认关闭，
+        缓存会在内存中保存整个工作表的数据，适合反复调用keys且文件不太大的情况
+        :param on_off: bool表示开关
+        :return: None
+        """
+        self._recorder._use_keys_cache = on_off
+        if not on_off:
+            self._recorder._keys_cache = None
+
     def row_num_title(self, title):
         """设置dict_keys返回的数据中，行号的键名
         :param title: 行号标题
@@ -279,6 +319,16 @@ class RecorderSetter(SheetLikeSetter):
         """
         self._recorder._style = style
 
+    def xlsx_engine(self, engine):
+        """设置追加数据到已有xlsx文件的方式，只有xlsx格式有效
+        :param engine: 'openpyxl'为加载整个工作簿再保存；'stream'为直接在工作表xml末尾插入行，
+                       内存占用只与本批数据有关，不支持样式和新建工作表，遇到时自动改用openpyxl
+        :return: None
+        """
+        if engine not in ('openpyxl', 'stream'):
+            raise ValueError("engine参数只能是'openpyxl'或'stream'。")
+        self._recorder._xlsx_engine = engine
+
     def path(self, path, file_type=None):
         """设置文件路径
         :param path: 文件路径
@@ -290,11 +340,28 @@ class RecorderSetter(SheetLikeSetter):
         self._recorder._head = {} if self._recorder.type == 'xlsx' else None
 
     def head(self, head, table=None):
-        """设置表头。只有 csv 和 xlsx 格式支持设置表头
+        """设置表头。只有 csv 和 xlsx 格式支持设置表头，jsonl 格式设置后用于fit_head排列键的顺序
         :param head: 表头，列表或元组
         :param table: 表名，只xlsx格式文件有效
         :return: None
         """
+        if self._recorder.type in ('jsonl', 'ndjson'):
+            if not isinstance(head, (list, tuple)):
+                raise TypeError('head参数只能是list或tuple格式。')
+            self._recorder._head = list(head)
+            return
+
+        if self._recorder.type == 'xlsx' and self._recorder._wb is not None:  # 会话中改在打开的工作簿中设置，保存时不被覆盖
+            if not isinstance(head, (list, tuple)):
+                raise TypeError('head参数只能是list或tuple格式。')
+            self._recorder._begin_write()
+            try:
+                if self._recorder._wb is not None and self._recorder._wb_path == self._recorder.path:
+                    _set_wb_head(self._recorder._wb, head, table or self._recorder.table)
+                    return
+            finally:
+                self._recorder._end_write()
+
         super().head(head, table)
         if self._recorder.type == 'xlsx':
             if not self._recorder._head or not isinstance(self._recorder._head, dict):
@@ -310,8 +377,8 @@ class RecorderSetter(SheetLikeSetter):
         :param on_off: bool表示开关
         :return: None
         """
-        if self._recorder.type not in ('csv', 'xlsx'):
-            raise TypeError('只有csv或xlsx格式可设置fit_head。')
+        if self._recorder.type not in ('csv', 'xlsx', 'jsonl', 'ndjson'):
+            raise TypeError('只有csv、xlsx或jsonl格式可设置fit_head。')
         self._recorder._fit_head = on_off
 
 
@@ -336,6 +403,193 @@ class DBSetter(BaseSetter):
 
         self._recorder._data = {}
 
+    def upsert_keys(self, keys, table=None):
+        """设置用于判断重复数据的唯一键列，写入时自动建立唯一索引，键值已存在的行更新其它列，而不是新增一行
+        :param keys: 列名或列名组成的列表，为None时取消该表的设置
+        :param table: 数据表名称，为None时使用默认表
+        :return: None
+        """
+        table = table or self._recorder.table
+        if not isinstance(table, str):
+            raise RuntimeError('未指定数据库表名。')
+
+        if not keys:
+            self._recorder._upsert_keys.pop(table, None)
+        else:
+            self._recorder._upsert_keys[table] = (keys,) if isinstance(keys, str) else tuple(keys)
+        self._recorder._indexed.discard(table)
+
+    def schema(self, schema, table=None):
+        """设置新建数据表或新增列时各列的类型，未指定的列根据首批数据推断
+        :param schema: 格式为{列名: 类型}，如{'id': 'INTEGER', 'price': 'REAL'}，新建表时按此顺序建立这些列，为None时取消
+        :param table: 数据表名称，为None时使用默认表
+        :return: None
+        """
+        table = table or self._recorder.table
+        if not isinstance(table, str):
+            raise RuntimeError('未指定数据库表名。')
+
+        if not schema:
+            self._recorder._schemas.pop(table, None)
+        elif not isinstance(schema, dict):
+            raise TypeError('schema参数只能是dict。')
+        else:
+            self._recorder._schemas[table] = dict(schema)
+
+    def indexes(self, indexes, table=None):
+        """设置数据表要建立的索引，写入数据时自动建立
+        :param indexes: 列名或列名组成的tuple组成的列表，如['url', ('site', 'date')]，为None时取消
+        :param table: 数据表名称，为None时使用默认表
+        :return: None
+        """
+        table = table or self._recorder.table
+        if not isinstance(table, str):
+            raise RuntimeError('未指定数据库表名。')
+
+        if not indexes:
+            self._recorder._indexes.pop(table, None)
+        else:
+            if isinstance(indexes, str):
+                indexes = [indexes]
+            self._recorder._indexes[table] = [(i,) if isinstance(i, str) else tuple(i) for i in indexes]
+        self._recorder._index_ready.discard(table)
+
+    def defer_indexes(self, on_off=True):
+        """设置是否延迟建立索引，用于批量导入。开启后写入数据时先删除已设置的索引，调用record()时再一次建立，
+        缓存满自动写入时不建立。关闭时立即建立等待中的索引
+        :param on_off: bool表示开关
+        :return: None
+        """
+        self._recorder._defer_index = on_off
+        if not on_off:
+            self._recorder.build_indexes()
+
+    def performance(self, profile=None, journal_mode=None, synchronous=None, cache_size=None,
+                    mmap_size=None, temp_store=None, page_size=None):
+        """设置sqlite的性能参数，在当前连接立即生效，重新连接时自动再次设置，参数为None时不修改
+        :param profile: 预设名称，'bulk'为批量导入（WAL，不等待落盘），'durable'为安全写入（WAL，每次提交落盘），
+                        'default'为sqlite默认值，其余参数可覆盖预设中的值
+        :param journal_mode: 日志模式，'DELETE'、'TRUNCATE'、'PERSIST'、'MEMORY'、'WAL'或'OFF'
+        :param synchronous: 落盘级别，'OFF'、'NORMAL'、'FULL'或'EXTRA'
+        :param cache_size: sqlite页缓存大小，正数为页数，负数为KiB数
+        :param mmap_size: 内存映射读取的最大字节数，0为不使用
+        :param temp_store: 临时表存放位置，'DEFAULT'、'FILE'或'MEMORY'
+        :param page_size: 页大小，须为512到65536之间2的幂，只对新数据库或VACUUM后有效，WAL模式下不能修改
+        :return: None
+        """
+        pragmas = {}
+        if profile is not None:
+            if profile not in self._recorder.PROFILES:
+                raise ValueError(f'profile参数只能是{"、".join(self._recorder.PROFILES)}。')
+            pragmas.update(self._recorder.PROFILES[profile])
+
+        options = {'journal_mode': ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'),
+                   'synchronous': ('OFF', 'NORMAL', 'FULL', 'EXTRA'),
+                   'temp_store': ('DEFAULT', 'FILE', 'MEMORY')}
+        for k, v in (('journal_mode', journal_mode), ('synchronous', synchronous), ('temp_store', temp_store)):
+            if v is None:
+                continue
+            v = str(v).upper()
+            if v not in options[k]:
+                raise ValueError(f'{k}参数只能是{"、".join(options[k])}。')
+            pragmas[k] = v
+
+        for k, v in (('cache_size', cache_size), ('mmap_size', mmap_size), ('page_size', page_size)):
+            if v is None:
+                continue
+            if not isinstance(v, int) or isinstance(v, bool):
+                raise TypeError(f'{k}参数只能是int。')
+            pragmas[k] = v
+
+        if page_size is not None and (page_size < 512 or page_size > 65536 or page_size & (page_size - 1)):
+            raise ValueError('page_size须为512到65536之间2的幂。')
+        if mmap_size is not None and mmap_size < 0:
+            raise ValueError('mmap_size不能小于0。')
+
+        self._recorder._pragmas.update(pragmas)
+        if self._recorder._conn is not None:
+            self._recorder._begin_write()  # 等待正在进行的写入结束
+            try:
+                self._recorder._set_pragmas()
+            finally:
+                self._recorder._end_write()
+
+
+class ByteSetter(OriginalSetter):
+    def path(self, path):
+        """重写父类方法
+        :param path: 文件路径
+        :return: None
+        """
+        super().path(path)
+        self._recorder._close_fd()
+        self._recorder._reset_filled()
+
+    def cache_bytes(self, size):
+        """设置缓存数据达到多少字节时写入文件，与cache_size先达到的一个触发写入
+        :param size: 字节数，0为不限
+        :return: None
+        """
+        if not isinstance(size, int) or size < 0:
+            raise TypeError('cache_bytes值只能是int，且必须>=0')
+        self._recorder._cache_bytes = size
+
+    def total_size(self, size):
+        """设置文件的最终大小（如HTTP的Content-Length），写入时预先分配空间，超出此大小的数据会报错，
+        未指定seek的数据接在已写入的最远位置后面，可用missing_ranges()查看未写入的范围
+        :param size: 字节数，为None时取消
+        :return: None
+        """
+        if size is not None and (not isinstance(size, int) or size < 0):
+            raise TypeError('total_size值只能是None或int，且必须>=0')
+        self._recorder.record()
+        self._recorder._close_fd()  # 重新打开时按新大小分配空间
+        self._recorder._total_size = size
+
+    def journal(self, on_off=True):
+        """设置是否把每次写入文件的范围记录到同名.ranges日志文件，开启时读取已有的日志，
+        进程中断后重新开启，可用missing_ranges()获取还需写入的范围
+        :param on_off: bool表示开关
+        :return: None
+        """
+        self._recorder.record()
+        self._recorder._journal = on_off
+        if on_off:
+            self._recorder._reset_filled()
+
+    def direct_write(self, on_off=True):
+        """设置指定了seek的数据是否不经缓存，由调用线程直接用pwrite()写入文件，多个线程可同时写入不同位置，
+        未指定seek的数据仍先缓存，系统不支持pwrite()时（如Windows）此设置无效
+        :param on_off: bool表示开关
+        :return: None
+        """
+        if on_off and not self._recorder._direct:
+            self._recorder.record()  # 先写入已缓存的数据，避免覆盖之后直接写入的数据
+        self._recorder._direct = on_off
+
+
+class ShardedDBSetter(object):
+    def __init__(self, recorder):
+        self._recorder = recorder
+
+    def path(self, path):
+        """设置合并后的文件路径，并连接本对象使用的分片
+        :param path: 文件路径
+        :return: None
+        """
+        self._recorder.record()
+        self._recorder._path = str(path)
+        self._recorder._connect()
+
+    def show_msg(self, on_off):
+        """设置是否显示运行信息，同时设置各分片记录器
+        :param on_off: bool表示开关
+        :return: None
+        """
+        self._recorder.show_msg = on_off
+        for r in self._recorder._recorders.values():
+            r.show_msg = on_off
+
 
 def set_csv_head(file_path, head, encoding='utf-8', delimiter=',', quote_char='"'):
     """设置csv文件的表头
@@ -373,16 +627,29 @@ def set_xlsx_head(file_path, head, table):
     """
     if Path(file_path).exists():
         wb = load_workbook(file_path)
-        if table:
-            ws = wb[table] if table in [i.title for i in wb.worksheets] else wb.create_sheet(title=table)
-        else:
-            ws = wb.active
+        _set_wb_head(wb, head, table)
 
     else:
         wb = Workbook()
-        ws = wb.active
         if table:
-            ws.title = table
+            wb.active.title = table
+        _set_wb_head(wb, head, None)
+
+    wb.save(file_path)
+    wb.close()
+
+
+def _set_wb_head(wb, head, table):
+    """设置已打开的工作簿中工作表的表头，工作表不存在时新建
+    :param wb: Workbook对象
+    :param head: 表头列表或元组
+    :param table: 工作表名称，为None时使用活动工作表
+    :return: None
+    """
+    if table:
+        ws = wb[table] if table in [i.title for i in wb.worksheets] else wb.create_sheet(title=table)
+    else:
+        ws = wb.active
 
     if len(ws[1]) > len(head):
         head = list(head)
@@ -390,6 +657,3 @@ def set_xlsx_head(file_path, head, table):
 
     for key, i in enumerate(head, 1):
         ws.cell(1, key).value = process_content(i, True)
-
-    wb.save(file_path)
-    wb.close()
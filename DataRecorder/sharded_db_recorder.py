@@ -0,0 +1,223 @@
+# -*- coding:utf-8 -*-
+from os import replace
+from pathlib import Path
+from sqlite3 import connect
+from time import perf_counter
+from zlib import crc32
+
+from .db_recorder import DBRecorder
+from .setter import ShardedDBSetter
+
+
+class ShardedDBRecorder(object):
+    def __init__(self, path=None, shards=4, cache_size=None, table=None, key=None, shard=None):
+        """把数据分散写入多个sqlite文件的工具，每个文件由一个DBRecorder写入，可用merge()合并
+        :param path: 合并后的文件路径，分片文件保存在同一文件夹，文件名后加'_序号'
+        :param shards: 分片数量
+        :param cache_size: 每个分片每接收多少条记录写入文件，0为不自动写入
+        :param table: 默认表名
+        :param key: 按此列的值分配数据到各分片，同一值的数据总在同一分片，为None时须指定shard
+        :param shard: 只写入此序号的分片，用于多进程时每个进程写入自己的分片，从0开始
+        """
+        if not isinstance(shards, int) or shards < 1:
+            raise ValueError('shards须为大于0的int。')
+        if key is None and shard is None:
+            raise ValueError('key和shard须至少指定一个。')
+        if shard is not None and not 0 <= shard < shards:
+            raise ValueError(f'shard须在0到{shards - 1}之间。')
+
+        self._path = None
+        self._shards = shards
+        self._key = key
+        self._shard = shard
+        self._cache = cache_size
+        self._table = table
+        self._recorders = {}  # 各分片的记录器，格式为{序号: DBRecorder}
+        self._setter = None
+        self.show_msg = True
+        if path:
+            self.set.path(path)
+
+    @property
+    def set(self):
+        """返回用于设置属性的对象"""
+        if self._setter is None:
+            self._setter = ShardedDBSetter(self)
+        return self._setter
+
+    @property
+    def path(self):
+        """返回合并后的文件路径"""
+        return self._path
+
+    @property
+    def shards(self):
+        """返回分片数量"""
+        return self._shards
+
+    @property
+    def recorders(self):
+        """返回本对象使用的各分片记录器组成的列表，可用于分别设置"""
+        return list(self._recorders.values())
+
+    def shard_path(self, num):
+        """返回分片文件路径
+        :param num: 分片序号
+        :return: 文件路径
+        """
+        p = Path(self._path)
+        return str(p.with_name(f'{p.stem}_{num}{p.suffix or ".db"}'))
+
+    def add_data(self, data, table=None):
+        """添加数据，按key列的值或指定的分片写入
+        :param data: 可以是一维或二维数据，按key分配时须为dict格式
+        :param table: 数据要插入的表名称
+        :return: None
+        """
+        if not self._recorders:
+            raise ValueError('保存路径为空。')
+
+        if self._shard is not None:
+            self._recorders[self._shard].add_data(data, table)
+            return
+
+        rows = [data] if isinstance(data, dict) else data
+        if not isinstance(rows, (list, tuple)) or not all(isinstance(i, dict) for i in rows):
+            raise TypeError('按key分配分片时数据须为dict格式。')
+        for row in rows:
+            if self._key not in row:
+                raise KeyError(f'数据中没有key列：{self._key}')
+            num = crc32(str(row[self._key]).encode('utf-8')) % self._shards
+            self._recorders[num].add_data(row, table)
+
+    def record(self):
+        """把所有分片缓存中的数据写入文件
+        :return: None
+        """
+        for r in self._recorders.values():
+            r.record()
+
+    def merge(self, path=None):
+        """把所有分片文件合并到一个数据库。合并到临时文件，完成后替换目标文件，可重复合并。
+        分片中的表按列名并集建立或补充列，唯一索引在复制数据前建立，重复的键以后面的分片为准，其它索引在数据复制完后建立
+        :param path: 合并后的文件路径，为None时使用path属性
+        :return: 合并后的文件路径
+        """
+        self.record()
+        path = str(path or self._path)
+        shards = [self.shard_path(i) for i in range(self._shards)]
+        if any(Path(i).resolve() == Path(path).resolve() for i in shards):
+            raise ValueError('合并后的文件不能是分片文件。')
+        shards = [i for i in shards if Path(i).exists()]
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = f'{path}.merging'
+        if Path(tmp).exists():
+            Path(tmp).unlink()
+        t = perf_counter()
+        conn = connect(tmp)
+        cur = conn.cursor()
+        indexes = {}  # 分片中的非唯一索引，复制完数据后建立
+        try:
+            try:
+                for shard_path in shards:  # 先按所有分片建立表、列和唯一索引，再复制数据
+                    _run_attached(conn, cur, shard_path, _merge_schema, indexes)
+                for shard_path in shards:
+                    _run_attached(conn, cur, shard_path, _copy_shard)
+                for sql in indexes.values():
+                    cur.execute(sql)
+                conn.commit()
+
+            finally:
+                cur.close()
+                conn.close()
+
+        except Exception:
+            if Path(tmp).exists():
+                Path(tmp).unlink()
+            raise
+
+        for suffix in ('-wal', '-shm', '-journal'):  # 原文件遗留的日志不能用于新文件
+            if Path(path + suffix).exists():
+                Path(path + suffix).unlink()
+        replace(tmp, path)
+        if self.show_msg:
+            print(f'{path} 合并{self._shards}个分片用时{perf_counter() - t:.2f}秒。')
+        return path
+
+    def _connect(self):
+        """关闭原来的分片，按当前路径建立本对象使用的各分片记录器"""
+        for r in self._recorders.values():
+            r._close_connection()
+        nums = range(self._shards) if self._shard is None else (self._shard,)
+        self._recorders = {i: DBRecorder(self.shard_path(i), self._cache, self._table) for i in nums}
+        for r in self._recorders.values():
+            r.show_msg = self.show_msg
+
+
+def _run_attached(conn, cur, shard_path, func, *args):
+    """把分片附加为shard后执行操作并提交，出错时回滚，最后分离分片
+    :param conn: 主数据库连接
+    :param cur: 主数据库游标
+    :param shard_path: 分片文件路径
+    :param func: 要执行的函数，第一个参数为游标
+    :param args: 传给func的其它参数
+    :return: None
+    """
+    cur.execute('ATTACH DATABASE ? AS shard', (shard_path,))
+    try:
+        func(cur, *args)
+        conn.commit()
+    except Exception:
+        conn.rollback()  # 事务未结束时不能分离分片
+        raise
+    finally:
+        cur.execute('DETACH DATABASE shard')
+
+
+def _merge_schema(cur, indexes):
+    """按已附加为shard的分片在主数据库建立表、补充列和建立唯一索引
+    :param cur: 主数据库游标
+    :param indexes: 收集分片中非唯一索引建立语句的dict，格式为{索引名: sql}
+    :return: None
+    """
+    cur.execute("select name from main.sqlite_master where type='table'")
+    main_tables = {i[0] for i in cur.fetchall()}
+    cur.execute("select type, name, sql from shard.sqlite_master "
+                "where type in ('table', 'index') and sql is not null and name not like 'sqlite_%' "
+                "order by type='index'")
+
+    for kind, name, sql in cur.fetchall():
+        if kind == 'index':
+            if 'IF NOT EXISTS' not in sql.upper():
+                sql = sql.replace('INDEX', 'INDEX IF NOT EXISTS', 1)
+            if sql.upper().startswith('CREATE UNIQUE'):
+                cur.execute(sql)
+            else:
+                indexes.setdefault(name, sql)
+            continue
+
+        if name not in main_tables:
+            cur.execute(sql)
+            main_tables.add(name)
+            continue
+
+        cur.execute(f'PRAGMA shard.table_info({name})')
+        shard_cols = [(i[1], i[2]) for i in cur.fetchall()]
+        cur.execute(f'PRAGMA main.table_info({name})')
+        main_cols = {i[1] for i in cur.fetchall()}
+        for col, col_type in shard_cols:
+            if col not in main_cols:
+                cur.execute(f'ALTER TABLE main.{name} ADD COLUMN {col} {col_type}'.strip())
+
+
+def _copy_shard(cur):
+    """把已附加为shard的分片中所有表的数据复制到主数据库，唯一键重复时替换已有的行
+    :param cur: 主数据库游标
+    :return: None
+    """
+    cur.execute("select name from shard.sqlite_master where type='table' and name not like 'sqlite_%'")
+    for name, in cur.fetchall():
+        cur.execute(f'PRAGMA shard.table_info({name})')
+        cols = ','.join(i[1] for i in cur.fetchall())
+        cur.execute(f'INSERT OR REPLACE INTO main.{name} ({cols}) SELECT {cols} FROM shard.{name}')
@@ -0,0 +1,58 @@
+# -*- coding:utf-8 -*-
+from pathlib import Path
+from sqlite3 import Connection, Cursor
+from typing import Union, Any, Optional, Dict, List, Callable
+
+from .db_recorder import DBRecorder
+from .setter import ShardedDBSetter
+
+
+class ShardedDBRecorder(object):
+    _path: Optional[str] = ...
+    _shards: int = ...
+    _key: Optional[str] = ...
+    _shard: Optional[int] = ...
+    _cache: Optional[int] = ...
+    _table: Optional[str] = ...
+    _recorders: Dict[int, DBRecorder] = ...
+    _setter: Optional[ShardedDBSetter] = ...
+    show_msg: bool = ...
+
+    def __init__(self,
+                 path: Union[str, Path] = None,
+                 shards: int = 4,
+                 cache_size: int = None,
+                 table: str = None,
+                 key: str = None,
+                 shard: int = None): ...
+
+    @property
+    def set(self) -> ShardedDBSetter: ...
+
+    @property
+    def path(self) -> Optional[str]: ...
+
+    @property
+    def shards(self) -> int: ...
+
+    @property
+    def recorders(self) -> List[DBRecorder]: ...
+
+    def shard_path(self, num: int) -> str: ...
+
+    def add_data(self, data: Any, table: str = None) -> None: ...
+
+    def record(self) -> None: ...
+
+    def merge(self, path: Union[str, Path, None] = None) -> str: ...
+
+    def _connect(self) -> None: ...
+
+
+def _run_attached(conn: Connection, cur: Cursor, shard_path: str, func: Callable, *args: Any) -> None: ...
+
+
+def _merge_schema(cur: Cursor, indexes: Dict[str, str]) -> None: ...
+
+
+def _copy_shard(cur: Cursor) -> None: ...
@@ -2,7 +2,7 @@
 from copy import copy
 from threading import Lock
 
-from openpyxl.styles import Alignment, Font, Side, Border, Protection, GradientFill, PatternFill, Color
+from openpyxl.styles import Alignment, Font, Side, Border, Protection, GradientFill, PatternFill, Color, NamedStyle
 
 
 class CellStyle(object):
@@ -95,6 +95,15 @@ class CellStyle(object):
         else:
             self._cover_to_cell(cell)
 
+    def to_named_style(self, name):
+        """把当前样式转为命名样式，注册到工作簿后可供多个单元格共用，用于只写模式
+        :param name: 样式名称
+        :return: NamedStyle对象
+        """
+        style = NamedStyle(name=name)
+        self._replace_to_cell(style)
+        return style
+
     def _cover_to_cell(self, cell):
         """把当前样式复制到目标单元格，只覆盖有设置的项，没有设置的原有的项不变
         :param cell: 被设置样式的单元格对象
@@ -3,7 +3,7 @@ from threading import Lock
 from typing import Literal, Optional, Any, Union
 
 from openpyxl.cell import Cell
-from openpyxl.styles import Alignment, Font, Border, Fill, Protection, Side, PatternFill, Color
+from openpyxl.styles import Alignment, Font, Border, Fill, Protection, Side, PatternFill, Color, NamedStyle
 
 LINES = Literal['dashDot', 'dashDotDot', 'dashed', 'dotted', 'double', 'hair', 'medium', 'mediumDashDot',
 'mediumDashDotDot', 'mediumDashed', 'slantDashDot', 'thick', 'thin', None]
@@ -54,6 +54,8 @@ class CellStyle(object):
 
     def to_cell(self, cell: Cell, replace: bool = True) -> None: ...
 
+    def to_named_style(self, name: str) -> NamedStyle: ...
+
     def _cover_to_cell(self, cell: Cell) -> None: ...
 
     def _replace_to_cell(self, cell: Cell) -> None: ...
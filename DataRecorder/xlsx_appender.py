@@ -0,0 +1,270 @@
+# -*- coding:utf-8 -*-
+from os import replace, remove, close
+from pathlib import Path
+from re import compile, DOTALL
+from shutil import copyfileobj, copymode
+from tempfile import mkstemp
+from xml.etree.ElementTree import fromstring, iterparse
+from xml.sax.saxutils import escape, unescape
+from zipfile import ZipFile, ZipInfo
+
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import range_boundaries
+
+_NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+_ROW_NUM = compile(rb'<row\b[^>]*?\sr="(\d+)"')
+_ROW_NO_NUM = compile(rb'<row\b(?:(?!\sr=")[^>])*>')
+_ROW_END = compile(rb'<row\b[^>]*?/>|</row>')
+_CELL = compile(r'<c\b([^>]*?)(?:/>|>(.*?)</c>)', DOTALL)
+_CELL_REF = compile(r'\sr="([A-Z]+)\d+"')
+_CELL_TYPE = compile(r'\st="(\w+)"')
+_VALUE = compile(r'<v>(.*?)</v>', DOTALL)
+_TEXT = compile(r'<t\b[^>]*?(?:/>|>(.*?)</t>)', DOTALL)
+_DIMENSION = compile(rb'<dimension\s+ref="([^"]*)"\s*/>')
+_SHEET_DATA_END = b'</sheetData>'
+_CHUNK = 1 << 20
+
+
+def get_xlsx_sheets(path):
+    """读取xlsx文件中工作表名称和对应xml文件，不加载工作表内容
+    :param path: 文件路径
+    :return: (名称, xml路径)组成的列表和活动工作表序号
+    """
+    with ZipFile(path) as z:
+        wb = fromstring(z.read('xl/workbook.xml'))
+        rels = fromstring(z.read('xl/_rels/workbook.xml.rels'))
+
+    targets = {}
+    for rel in rels.iter(f'{_NS_PKG_REL}Relationship'):
+        target = rel.get('Target')
+        target = target[1:] if target.startswith('/') else f'xl/{target}'
+        targets[rel.get('Id')] = target
+
+    sheets = [(s.get('name'), targets[s.get(f'{_NS_REL}id')]) for s in wb.iter(f'{_NS_MAIN}sheet')]
+    view = wb.find(f'{_NS_MAIN}bookViews/{_NS_MAIN}workbookView')
+    active = int(view.get('activeTab', 0)) if view is not None else 0
+    return sheets, active if active < len(sheets) else 0
+
+
+def get_xlsx_head(path, name):
+    """只读取工作表第一行的值，用于匹配表头，不加载整个工作表
+    :param path: 文件路径
+    :param name: 工作表名称
+    :return: 第一行的值组成的列表
+    """
+    from openpyxl.utils import column_index_from_string
+    part = dict(get_xlsx_sheets(path)[0])[name]
+    with ZipFile(path) as z:
+        with z.open(part) as f:
+            buf = b''
+            while True:
+                start = buf.find(b'<row ')
+                m = _ROW_END.search(buf, start) if start > -1 else None
+                if m:
+                    break
+                chunk = f.read(_CHUNK)
+                if not chunk:
+                    return []
+                buf += chunk
+
+        row_num = _ROW_NUM.match(buf, start)
+        if not row_num or row_num.group(1) != b'1':
+            return []
+
+        cells = {}
+        for c in _CELL.finditer(buf[start:m.end()].decode('utf-8')):
+            attrs, inner = c.group(1), c.group(2) or ''
+            ref = _CELL_REF.search(attrs)
+            col = column_index_from_string(ref.group(1)) if ref else len(cells) + 1
+            kind = _CELL_TYPE.search(attrs)
+            kind = kind.group(1) if kind else 'n'
+            if kind == 'inlineStr':
+                value = ''.join(unescape(t or '') for t in _TEXT.findall(inner))
+            else:
+                value = _VALUE.search(inner)
+                if not value:
+                    continue
+                value = unescape(value.group(1))
+                if kind == 's':
+                    value = int(value)
+                elif kind == 'b':
+                    value = value == '1'
+                elif kind == 'n':
+                    value = float(value) if '.' in value or 'E' in value else int(value)
+            cells[col] = (kind, value)
+
+        shared = [v for k, v in cells.values() if k == 's']
+        if shared:
+            shared = _get_shared_strings(z, max(shared))
+            cells = {k: (t, shared[v] if t == 's' and v < len(shared) else v) for k, (t, v) in cells.items()}
+
+    return [cells[i][1] if i in cells else None for i in range(1, max(cells, default=0) + 1)]
+
+
+def append_xlsx_rows(path, rows):
+    """把多行数据直接追加到xlsx文件工作表的xml中，不加载整个工作簿，其它文件原样复制
+    字符串以内联字符串写入，以'='开头的字符串作为公式写入
+    :param path: 文件路径
+    :param rows: 格式为{工作表名称: 行数据列表}，行数据须已用process_content()处理
+    :return: 是否追加成功，工作表不存在或xml格式不支持时返回False，文件不会被修改
+    """
+    sheets = dict(get_xlsx_sheets(path)[0])
+    if any(name not in sheets for name in rows):
+        return False
+    parts = {sheets[name]: data for name, data in rows.items()}
+
+    fd, tmp = mkstemp(suffix='.tmp', dir=Path(path).parent)
+    close(fd)
+    try:
+        with ZipFile(path) as zin, ZipFile(tmp, 'w') as zout:
+            for info in zin.infolist():
+                new_info = ZipInfo(info.filename, info.date_time)
+                new_info.compress_type = info.compress_type
+                new_info.external_attr = info.external_attr
+                with zin.open(info) as src, zout.open(new_info, 'w', force_zip64=info.file_size > 1 << 30) as dst:
+                    if info.filename in parts:
+                        last_row = _get_last_row(zin, info)
+                        if last_row is None or not _patch_sheet(src, dst, parts[info.filename], last_row):
+                            return False
+                    else:
+                        copyfileobj(src, dst, _CHUNK)
+
+        copymode(path, tmp)  # mkstemp()建立的文件权限为0600，改为与原文件相同
+        replace(tmp, path)
+
+    finally:
+        if Path(tmp).exists():
+            remove(tmp)
+
+    return True
+
+
+def _get_shared_strings(zin, max_index):
+    """流式读取共享字符串，读到指定序号为止
+    :param zin: ZipFile对象
+    :param max_index: 需要的最大序号
+    :return: 共享字符串列表
+    """
+    res = []
+    if 'xl/sharedStrings.xml' not in zin.namelist():
+        return res
+
+    with zin.open('xl/sharedStrings.xml') as f:
+        for _, elem in iterparse(f):
+            if elem.tag != f'{_NS_MAIN}si':
+                continue
+            res.append(''.join(t.text or '' for t in elem.iter(f'{_NS_MAIN}t')
+                               if t not in elem.findall(f'{_NS_MAIN}rPh/{_NS_MAIN}t')))
+            elem.clear()
+            if len(res) > max_index:
+                break
+
+    return res
+
+
+def _get_last_row(zin, info):
+    """流式扫描工作表xml，获取最后一行的行号，行须按顺序排列且都有r属性
+    :param zin: ZipFile对象
+    :param info: 工作表xml的ZipInfo对象
+    :return: 最后一行行号，空表返回0，格式不支持时返回None
+    """
+    last_row = 0
+    found = False
+    tail = b''
+    with zin.open(info) as f:
+        while True:
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                break
+            buf = tail + chunk
+            found = found or b'<sheetData' in buf
+            if _ROW_NO_NUM.search(buf):  # 省略行号的行要按位置推算，交给openpyxl处理
+                return None
+            m = _ROW_NUM.match(buf, max(buf.rfind(b'<row '), 0))  # 行按顺序排列，只需找每块最后一行
+            if m:
+                last_row = int(m.group(1))
+            tail = buf[buf.rfind(b'<'):]  # 未完整的标签留到下一块再匹配
+
+    return last_row if found else None
+
+
+def _patch_sheet(src, dst, rows, last_row):
+    """复制工作表xml，在</sheetData>前插入新行，并更新dimension
+    :param src: 原xml文件对象
+    :param dst: 新xml文件对象
+    :param rows: 行数据列表
+    :param last_row: 原最后一行行号
+    :return: 是否成功
+    """
+    new_rows = []
+    max_col = 0
+    row_num = last_row
+    for row in rows:
+        row_num += 1
+        max_col = max(max_col, len(row))
+        xml = _row_xml(row_num, row)
+        if xml:
+            new_rows.append(xml)
+    new_rows = ''.join(new_rows).encode('utf-8')
+
+    # sheetData之前的部分通常很小，读入后修改dimension
+    head = b''
+    while b'<sheetData' not in head:
+        chunk = src.read(_CHUNK)
+        if not chunk:
+            return False
+        head += chunk
+
+    m = _DIMENSION.search(head, 0, head.index(b'<sheetData'))
+    if m and row_num > last_row:
+        min_col, min_row, old_col, _ = range_boundaries(m.group(1).decode())
+        ref = f'{get_column_letter(min_col or 1)}{min_row or 1}:' \
+              f'{get_column_letter(max(old_col or 1, max_col, 1))}{row_num}'
+        head = head[:m.start(1)] + ref.encode() + head[m.end(1):]
+
+    empty = head.find(b'<sheetData/>')
+    if empty > -1:
+        dst.write(head[:empty] + b'<sheetData>' + new_rows + _SHEET_DATA_END + head[empty + 12:])
+        copyfileobj(src, dst, _CHUNK)
+        return True
+
+    buf = head
+    keep = len(_SHEET_DATA_END) - 1
+    while True:
+        end = buf.find(_SHEET_DATA_END)
+        if end > -1:
+            dst.write(buf[:end] + new_rows + buf[end:])
+            copyfileobj(src, dst, _CHUNK)
+            return True
+
+        chunk = src.read(_CHUNK)
+        if not chunk:
+            return False
+        dst.write(buf[:-keep])
+        buf = buf[-keep:] + chunk
+
+
+def _row_xml(row_num, row):
+    """生成一行的xml
+    :param row_num: 行号
+    :param row: 行数据
+    :return: xml文本，没有数据时返回空字符串
+    """
+    cells = []
+    for col, value in enumerate(row, 1):
+        if value is None:
+            continue
+
+        ref = f'{get_column_letter(col)}{row_num}'
+        if isinstance(value, bool):
+            cells.append(f'<c r="{ref}" t="b"><v>{int(value)}</v></c>')
+        elif isinstance(value, (int, float)):
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        elif value.startswith('=') and len(value) > 1:
+            cells.append(f'<c r="{ref}"><f>{escape(value[1:])}</f><v></v></c>')
+        else:
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>')
+
+    return f'<row r="{row_num}">{"".join(cells)}</row>' if cells else ''
@@ -0,0 +1,25 @@
+# -*- coding:utf-8 -*-
+from pathlib import Path
+from typing import Union, List, Tuple, Dict, Optional, IO
+from zipfile import ZipFile, ZipInfo
+
+
+def get_xlsx_sheets(path: Union[str, Path]) -> Tuple[List[Tuple[str, str]], int]: ...
+
+
+def get_xlsx_head(path: Union[str, Path], name: str) -> list: ...
+
+
+def append_xlsx_rows(path: Union[str, Path], rows: Dict[str, List[list]]) -> bool: ...
+
+
+def _get_shared_strings(zin: ZipFile, max_index: int) -> List[str]: ...
+
+
+def _get_last_row(zin: ZipFile, info: ZipInfo) -> Optional[int]: ...
+
+
+def _patch_sheet(src: IO[bytes], dst: IO[bytes], rows: List[list], last_row: int) -> bool: ...
+
+
+def _row_xml(row_num: int, row: list) -> str: ...
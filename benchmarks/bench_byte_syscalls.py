@@ -0,0 +1,56 @@
+# -*- coding:utf-8 -*-
+"""统计ByteRecorder写入一批数据时的write系统调用次数（读取/proc/self/io的syscw）和用时，只能在Linux运行
+用法：python benchmarks/bench_byte_syscalls.py [片段数] [片段字节数]
+"""
+from pathlib import Path
+from sys import argv, path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+path.insert(0, str(Path(__file__).parent.parent))
+
+from DataRecorder import ByteRecorder
+
+
+def syscw():
+    """返回本进程到目前为止的write类系统调用次数"""
+    with open('/proc/self/io') as f:
+        for line in f:
+            if line.startswith('syscw'):
+                return int(line.split()[1])
+
+
+def run(file_path, mode, count, size):
+    """缓存全部片段后一次写入
+    :param file_path: 文件路径
+    :param mode: 'append'为追加到末尾，'seek'为指定位置，'small'为4字节小片段追加
+    :param count: 片段数
+    :param size: 片段字节数
+    :return: 系统调用次数和用时（秒）
+    """
+    r = ByteRecorder(file_path, 0)
+    r.show_msg = False
+    chunk = b'x' * (4 if mode == 'small' else size)
+    for i in range(count):
+        r.add_data(chunk, i * size if mode == 'seek' else None)
+    calls = syscw()
+    t = perf_counter()
+    r.record()
+    return syscw() - calls, perf_counter() - t
+
+
+def main():
+    if not Path('/proc/self/io').exists():
+        print('此脚本须在提供/proc/self/io的Linux系统运行。')
+        return
+    count = int(argv[1]) if len(argv) > 1 else 4000
+    size = int(argv[2]) if len(argv) > 2 else 16384
+    print(f'{count}个片段，每个{size}字节（small模式4字节）')
+    with TemporaryDirectory() as tmp:
+        for mode in ('append', 'seek', 'small'):
+            calls, seconds = run(Path(tmp) / f'{mode}.bin', mode, count, size)
+            print(f'{mode:>6}: write系统调用{calls}次，用时{seconds:.3f}秒')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# -*- coding:utf-8 -*-
+"""比较DBRecorder各性能预设（set.performance()）的写入速度，输出每秒写入行数
+用法：python benchmarks/bench_db_profile.py [行数] [cache_size]
+"""
+from pathlib import Path
+from sys import argv, path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+path.insert(0, str(Path(__file__).parent.parent))
+
+from DataRecorder import DBRecorder
+
+
+def run(file_path, profile, rows, cache_size):
+    """用指定预设写入数据
+    :param file_path: 数据库文件路径
+    :param profile: 预设名称，None为不设置
+    :param rows: 写入行数
+    :param cache_size: 每多少行提交一次
+    :return: 日志模式和每秒写入行数
+    """
+    r = DBRecorder(file_path, cache_size=cache_size, table='t')
+    r.show_msg = False
+    if profile:
+        r.set.performance(profile)
+    t = perf_counter()
+    for i in range(rows):
+        r.add_data({'a': i, 'b': f'text{i}', 'c': i * .5})
+    r.record()
+    speed = rows / (perf_counter() - t)
+    journal_mode = r.run_sql('pragma journal_mode')[0]
+    r._close_connection()
+    return journal_mode, speed
+
+
+def main():
+    rows = int(argv[1]) if len(argv) > 1 else 100000
+    cache_size = int(argv[2]) if len(argv) > 2 else 1000
+    print(f'写入{rows}行，每{cache_size}行提交一次')
+    with TemporaryDirectory() as tmp:
+        for profile in (None, *DBRecorder.PROFILES):
+            journal_mode, speed = run(Path(tmp) / f'{profile}.db', profile, rows, cache_size)
+            print(f'{str(profile):>8}: {speed:>10.0f}行/秒  journal_mode={journal_mode}')
+
+
+if __name__ == '__main__':
+    main()
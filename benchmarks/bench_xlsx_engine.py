@@ -0,0 +1,82 @@
+# -*- coding:utf-8 -*-
+"""比较xlsx_engine('stream')和xlsx_engine('openpyxl')追加数据到已有xlsx文件的用时和结果
+用法：python benchmarks/bench_xlsx_engine.py [已有行数] [追加行数]
+"""
+from pathlib import Path
+from shutil import copy
+from sys import argv, path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+path.insert(0, str(Path(__file__).parent.parent))
+
+from openpyxl import Workbook, load_workbook
+
+from DataRecorder import Recorder
+
+
+def make_file(file_path, rows):
+    """生成有rows行数据和另一个工作表的xlsx文件
+    :param file_path: 文件路径
+    :param rows: 数据行数
+    :return: None
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    ws.append(['a', 'b', 'c', 'd'])
+    for i in range(rows):
+        ws.append([i, f'text {i}', i * .5, 'x'])
+    wb.create_sheet('other').append(['k'])
+    wb.save(file_path)
+
+
+def append(file_path, engine, rows):
+    """用指定方式追加数据
+    :param file_path: 文件路径
+    :param engine: 'stream'或'openpyxl'
+    :param rows: 追加的行数
+    :return: 用时（秒）
+    """
+    r = Recorder(file_path)
+    r.show_msg = False
+    r.set.xlsx_engine(engine)
+    for i in range(rows):
+        r.add_data({'a': i, 'b': '<&>', 'c': True, 'd': '=1+2'})
+    r.add_data(['y'], table='other')
+    t = perf_counter()
+    r.record()
+    return perf_counter() - t
+
+
+def read_rows(file_path):
+    """读取各工作表的全部数据
+    :param file_path: 文件路径
+    :return: {工作表名: 行数据列表}
+    """
+    wb = load_workbook(file_path, read_only=True)
+    try:
+        return {ws.title: [list(i) for i in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+    finally:
+        wb.close()
+
+
+def main():
+    rows = int(argv[1]) if len(argv) > 1 else 200000
+    new_rows = int(argv[2]) if len(argv) > 2 else 1000
+    with TemporaryDirectory() as tmp:
+        src = Path(tmp) / 'src.xlsx'
+        make_file(src, rows)
+        print(f'原文件{rows}行，{src.stat().st_size}字节，追加{new_rows}行')
+
+        results = {}
+        for engine in ('stream', 'openpyxl'):
+            file_path = Path(tmp) / f'{engine}.xlsx'
+            copy(src, file_path)
+            print(f'{engine:>8}: {append(file_path, engine, new_rows):.3f}秒')
+            results[engine] = read_rows(file_path)
+
+        print('结果一致' if results['stream'] == results['openpyxl'] else '结果不一致')
+
+
+if __name__ == '__main__':
+    main()
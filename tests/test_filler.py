@@ -0,0 +1,26 @@
+# -*- coding:utf-8 -*-
+import pytest
+from openpyxl import Workbook
+
+from DataRecorder import Filler
+
+
+@pytest.fixture(params=['csv', 'xlsx'])
+def filler(request, tmp_path):
+    path = tmp_path / f'data.{request.param}'
+    rows = [['id', 'done'], *([i, None] for i in range(5))]
+    if request.param == 'csv':
+        path.write_text(''.join(f'{a},{b or ""}\n' for a, b in rows), encoding='utf-8')
+    else:
+        wb = Workbook()
+        for row in rows:
+            wb.active.append(row)
+        wb.save(path)
+    return Filler(path, sign_col=2)
+
+
+def test_iter_keys_limit(filler):
+    assert list(filler.iter_keys(limit=0)) == []
+    assert list(filler.iter_dict_keys(limit=0)) == []
+    assert len(list(filler.iter_keys(limit=2))) == 2
+    assert len(list(filler.iter_keys())) == 5
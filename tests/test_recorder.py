@@ -0,0 +1,39 @@
+# -*- coding:utf-8 -*-
+from openpyxl import load_workbook
+
+from DataRecorder import Recorder
+
+
+def _read(path):
+    wb = load_workbook(path)
+    try:
+        return {ws.title: [list(i) for i in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+    finally:
+        wb.close()
+
+
+def test_session_new_xlsx_uses_same_sheet_name(tmp_path):
+    for session in (False, True):
+        path = tmp_path / f'{session}.xlsx'
+        r = Recorder(path)
+        r.show_msg = False
+        if session:
+            with r:
+                r.add_data([1, 2])
+                r.record()
+        else:
+            r.add_data([1, 2])
+            r.record()
+        assert list(_read(path)) == ['Sheet1']
+
+
+def test_head_during_session_is_kept(tmp_path):
+    path = tmp_path / 'data.xlsx'
+    r = Recorder(path)
+    r.show_msg = False
+    with r:
+        r.add_data([1, 2])
+        r.record()
+        r.set.head(['a', 'b'])
+        r.add_data([3, 4])
+    assert _read(path)['Sheet1'] == [['a', 'b'], [3, 4]]
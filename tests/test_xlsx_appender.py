@@ -0,0 +1,27 @@
+# -*- coding:utf-8 -*-
+from os import chmod, name, stat
+from stat import S_IMODE
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from DataRecorder import Recorder
+
+
+@pytest.mark.skipif(name == 'nt', reason='Windows不支持完整的文件权限位')
+def test_stream_append_keeps_file_mode(tmp_path):
+    path = tmp_path / 'data.xlsx'
+    wb = Workbook()
+    wb.active.title = 'Sheet1'
+    wb.active.append(['a', 'b'])
+    wb.save(path)
+    chmod(path, 0o644)
+
+    r = Recorder(path)
+    r.show_msg = False
+    r.set.xlsx_engine('stream')
+    r.add_data([1, 2])
+    r.record()
+
+    assert S_IMODE(stat(path).st_mode) == 0o644
+    assert [list(i) for i in load_workbook(path).active.iter_rows(values_only=True)] == [['a', 'b'], [1, 2]]